@@ -33,6 +33,24 @@ class Settings(BaseSettings):
     RISTA_BRANCH_CODE: str
     RISTA_BASE_URL: str
 
+#  Rista transport (its own connection pool, separate from the payment gateways)
+    RISTA_TIMEOUT_SECONDS: float = 30.0
+    RISTA_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    RISTA_MAX_CONNECTIONS: int = 20
+    RISTA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    RISTA_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # Needs the h2 package; falls back to HTTP/1.1 without it
+    RISTA_HTTP2: bool = False
+    # Signed API tokens (those without a per-request jti) are reused for this long
+    RISTA_TOKEN_TTL_SECONDS: int = 60
+    # Circuit breaker, shared by all workers through Redis: opens when at least MIN_CALLS calls in a
+    # WINDOW fail at FAILURE_RATE or more, fails fast for OPEN_SECONDS, then lets one probe through
+    RISTA_CIRCUIT_ENABLED: bool = True
+    RISTA_CIRCUIT_WINDOW_SECONDS: int = 30
+    RISTA_CIRCUIT_MIN_CALLS: int = 10
+    RISTA_CIRCUIT_FAILURE_RATE: float = 0.5
+    RISTA_CIRCUIT_OPEN_SECONDS: int = 30
+
 #  PineLabs EDC credentials
     PINELABS_EDC_BASE_URL: str
     PINELABS_EDC_MERCHANT_ID: str
@@ -41,6 +59,77 @@ class Settings(BaseSettings):
     PINELABS_EDC_SECURITY_TOKEN: str
     PINELABS_EDC_USER_ID: str
 
+#  Payment gateway transport
+    # QR (PhonePe) and EDC (Pine Labs) initiation calls
+    PAYMENT_INIT_TIMEOUT_SECONDS: float = 30.0
+
+
+#  Catalog cache
+    CATALOG_L1_MAX_ENTRIES: int = 16
+    CATALOG_L1_TTL_SECONDS: float = 5.0
+    CATALOG_LOCK_TTL_SECONDS: float = 45.0
+    CATALOG_LOCK_WAIT_SECONDS: float = 5.0
+    CATALOG_SOFT_TTL_SECONDS: int = 3600
+    CATALOG_HARD_TTL_SECONDS: int = 86400
+    CATALOG_REFRESH_INTERVAL_SECONDS: int = 60
+    # Comma-separated channels kept warm by the background refresher, e.g. "Palas Kiosk"
+    CATALOG_REFRESH_CHANNELS: str = ""
+    # Kiosks may keep the catalog but must revalidate it (cheap 304 via ETag)
+    CATALOG_CACHE_CONTROL: str = "no-cache"
+    CATALOG_EVENTS_CATCHUP_SECONDS: float = 5.0
+    # Binary catalog format in Redis: "gzip" (default), "zstd" (needs zstandard) or "json"
+    CATALOG_BLOB_CODEC: str = "gzip"
+    CATALOG_BLOB_LEVEL: int = 6
+    # Keep writing the plain-JSON key while older workers are still running
+    CATALOG_WRITE_LEGACY_JSON: bool = True
+    CATALOG_GZIP_LEVEL: int = 6
+    CATALOG_BROTLI_QUALITY: int = 9
+
+
+#  Startup warm-up (catalogs for CATALOG_REFRESH_CHANNELS, DB pool, upstream connections)
+    WARMUP_ENABLED: bool = True
+    WARMUP_DB_CONNECTIONS: int = 2
+    WARMUP_TIMEOUT_SECONDS: float = 20.0
+
+
+#  KOT numbers (per-day Postgres sequences)
+    # Rollout-only: keep the kot_counters row in step while workers from before the sequences still
+    # allocate from it. Serialises every allocation on that row again, so turn it off once they are gone
+    KOT_SYNC_LEGACY_COUNTER: bool = False
+
+
+#  Idempotency-Key (POST /orders/, /payments/qr/init, /payments/edc/init)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    # Floor for a pending claim (a crashed worker's claim expires after it); raised automatically
+    # to cover CATALOG_LOCK_TTL_SECONDS + PAYMENT_INIT_TIMEOUT_SECONDS
+    IDEMPOTENCY_PENDING_TTL_SECONDS: int = 60
+    IDEMPOTENCY_WAIT_SECONDS: float = 30.0
+
+
+#  Latency metrics (GET /metrics); slower pipeline runs log their per-stage breakdown
+    SLOW_REQUEST_THRESHOLD_MS: float = 500.0
+
+
+#  KDS outbox (Rista sale posts run in background workers, off the request path)
+    # Concurrent posts per process; 0 leaves the outbox to other processes
+    KDS_OUTBOX_CONCURRENCY: int = 4
+    KDS_OUTBOX_POLL_SECONDS: float = 1.0
+    # A claimed row is retried after this if its worker dies mid-post; must outlast the Rista timeout
+    KDS_OUTBOX_LEASE_SECONDS: int = 120
+    KDS_OUTBOX_BACKOFF_BASE_SECONDS: float = 2.0
+    KDS_OUTBOX_BACKOFF_MAX_SECONDS: float = 300.0
+    KDS_OUTBOX_MAX_ATTEMPTS: int = 10
+
+
+#  KDS reconciliation sweeper (re-queues FAILED and abandoned PENDING posts of paid orders)
+    KDS_SWEEP_INTERVAL_SECONDS: int = 60
+    KDS_SWEEP_BATCH_SIZE: int = 50
+    # A FAILED order is retried once it has waited as long as it has been failing, within these bounds
+    KDS_SWEEP_MIN_BACKOFF_SECONDS: int = 60
+    KDS_SWEEP_MAX_BACKOFF_SECONDS: int = 3600
+    # PENDING/NOT_POSTED this long with nothing queued was abandoned; keep above KDS_OUTBOX_LEASE_SECONDS
+    KDS_SWEEP_STALE_SECONDS: int = 300
+
 
 #  Cash Payment PIN
     CASH_PAYMENT_PIN: str = "1234"
@@ -1,4 +1,4 @@
-from fastapi import Request, HTTPException, Depends
+from fastapi import Request, HTTPException, Depends, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 import redis.asyncio as redis
@@ -8,6 +8,7 @@ from app.utils.rista import RistaClient
 from app.services.catalog_service import CatalogService
 from app.services.order_service import OrderService
 from app.services.payment_service import PaymentService
+from app.services.idempotency import Idempotency
 
 async def get_http_client(request: Request) -> httpx.AsyncClient:
     return request.app.state.http_client
@@ -17,14 +18,24 @@ async def get_redis_client(request: Request) -> redis.Redis:
         raise HTTPException(status_code=503, detail="Redis connection not available")
     return request.app.state.redis_client
 
-async def get_rista_client(http_client = Depends(get_http_client)) -> RistaClient:
-    return RistaClient(http_client)
+async def get_binary_redis_client(request: Request) -> redis.Redis | None:
+    return getattr(request.app.state, "redis_binary_client", None)
+
+async def get_idempotency(
+        request: Request,
+        idempotency_key: str | None = Header(default=None),
+) -> Idempotency:
+    return Idempotency(getattr(request.app.state, "redis_client", None), idempotency_key)
+
+async def get_rista_client(request: Request) -> RistaClient:
+    return request.app.state.rista_client
 
 async def get_catalog_service(
         redis_client = Depends(get_redis_client),
-        rista_client = Depends(get_rista_client)
+        rista_client = Depends(get_rista_client),
+        blob_redis_client = Depends(get_binary_redis_client)
 ) -> CatalogService:
-    return CatalogService(redis_client, rista_client)
+    return CatalogService(redis_client, rista_client, blob_redis_client)
 
 async def get_order_service(
         db = Depends(get_db),
@@ -0,0 +1,135 @@
+"""
+In-process metrics, exposed in Prometheus text format on GET /metrics.
+
+Each worker keeps its own counts; scrape every worker (or sum across them).
+StageTimer breaks a request pipeline into named stages, records each into
+the stage histogram and logs the breakdown when the whole run is slower than
+SLOW_REQUEST_THRESHOLD_MS.
+"""
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # label set -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[tuple(sorted(labels.items()))] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+_registry: List[Histogram | Gauge] = []
+
+
+def histogram(name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help_text: str) -> Gauge:
+    metric = Gauge(name, help_text)
+    _registry.append(metric)
+    return metric
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = histogram("kiosk_stage_duration_seconds", "Duration of each stage of a request pipeline.")
+
+
+class StageTimer:
+    """
+    Times the stages of one pipeline run:
+
+        with StageTimer("create_order") as timer:
+            with timer.stage("catalog"):
+                ...
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.stages: List[Tuple[str, float]] = []
+        # Extra fields for the slow-request log line (e.g. order_id)
+        self.context: Dict[str, object] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages.append((name, elapsed))
+            stage_seconds.observe(elapsed, pipeline=self.pipeline, stage=name)
+
+    def __enter__(self) -> "StageTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        total = time.perf_counter() - self._started
+        stage_seconds.observe(total, pipeline=self.pipeline, stage="total")
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            breakdown = " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in self.stages)
+            context = " ".join(f"{key}={value}" for key, value in self.context.items())
+            outcome = f" failed={exc_type.__name__}" if exc_type else ""
+            logger.warning(f"Slow {self.pipeline}: total={total * 1000:.1f}ms {breakdown} {context}{outcome}".rstrip())
@@ -0,0 +1,107 @@
+"""
+Startup warm-up: pays the cold-start costs (Rista catalog fetch, DB connection
+setup, TLS handshakes to upstreams) before the server accepts connections,
+so the first kiosk request after a deploy does not.
+"""
+import time
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List
+
+import httpx
+import redis.asyncio as redis
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import engine
+from app.services.catalog_service import CatalogService
+from app.utils.rista import RistaClient
+
+logger = logging.getLogger(__name__)
+
+
+def configured_channels() -> List[str]:
+    return [c.strip() for c in settings.CATALOG_REFRESH_CHANNELS.split(",") if c.strip()]
+
+
+async def _warm_catalogs(
+        redis_client: redis.Redis | None,
+        rista_client: RistaClient,
+        blob_redis_client: redis.Redis | None,
+) -> Dict[str, Any]:
+    channels = configured_channels()
+    if not channels or redis_client is None:
+        return {}
+
+    service = CatalogService(redis_client, rista_client, blob_redis_client)
+
+    async def warm(channel: str) -> str:
+        entry = await service.get_entry(channel)
+        # Build the lookup tables now rather than on the first order
+        _ = entry.index
+        return entry.version
+
+    results = await asyncio.gather(*(warm(c) for c in channels), return_exceptions=True)
+    return {
+        channel: result if isinstance(result, str) else f"error: {result}"
+        for channel, result in zip(channels, results)
+    }
+
+
+async def _warm_db_pool() -> int:
+    """Opens connections concurrently so the pool holds them when released."""
+    count = settings.WARMUP_DB_CONNECTIONS
+    if count <= 0:
+        return 0
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(count)))
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+    return count
+
+
+async def _warm_upstreams(http_client: httpx.AsyncClient, rista_client: RistaClient) -> Dict[str, Any]:
+    """HEADs each upstream once so its client's pool keeps a live TLS connection."""
+    urls = {
+        "rista": (rista_client.client, settings.RISTA_BASE_URL),
+        "phonepe": (http_client, settings.PHONEPE_BASE_URL),
+        "pinelabs": (http_client, settings.PINELABS_EDC_BASE_URL),
+    }
+
+    async def connect(client: httpx.AsyncClient, url: str) -> str:
+        # Any HTTP status means the connection is up
+        response = await client.head(url, timeout=settings.WARMUP_TIMEOUT_SECONDS)
+        return str(response.status_code)
+
+    results = await asyncio.gather(*(connect(*target) for target in urls.values()), return_exceptions=True)
+    return {
+        name: result if isinstance(result, str) else f"error: {result}"
+        for name, result in zip(urls, results)
+    }
+
+
+async def warm_up(
+        redis_client: redis.Redis | None,
+        http_client: httpx.AsyncClient,
+        rista_client: RistaClient,
+        blob_redis_client: redis.Redis | None = None,
+) -> Dict[str, Any]:
+    """
+    Runs every warm-up step concurrently. Failures are logged and reported,
+    never raised: a cold start is slower, not broken.
+    """
+    started = time.perf_counter()
+    catalogs, db_connections, upstreams = await asyncio.gather(
+        asyncio.wait_for(_warm_catalogs(redis_client, rista_client, blob_redis_client), settings.WARMUP_TIMEOUT_SECONDS),
+        asyncio.wait_for(_warm_db_pool(), settings.WARMUP_TIMEOUT_SECONDS),
+        _warm_upstreams(http_client, rista_client),
+        return_exceptions=True,
+    )
+    summary = {
+        "catalogs": catalogs if not isinstance(catalogs, BaseException) else f"error: {catalogs!r}",
+        "db_connections": db_connections if not isinstance(db_connections, BaseException) else f"error: {db_connections!r}",
+        "upstreams": upstreams if not isinstance(upstreams, BaseException) else f"error: {upstreams!r}",
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(f"Warm-up finished: {summary}")
+    return summary
@@ -1,3 +1,4 @@
 from .kot_counter import KotCounter
 from .order import Order, PaymentStatus, KdsStatus, PaymentMethod
 from .edc_config import EdcConfig
+from .kds_outbox import KdsOutbox
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+class KdsOutbox(Base):
+    """
+    One pending Rista KDS post per paid order. Written in the same transaction
+    that marks the payment COMPLETED and drained by app.services.kds_outbox;
+    the row is deleted once the sale is posted (or retries are exhausted).
+    """
+    __tablename__ = "kds_outbox"
+    __table_args__ = (
+        UniqueConstraint("order_id", name="uq_kds_outbox_order_id"),
+        Index("idx_kds_outbox_due", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Due time; pushed forward by the claim lease while a worker holds the row
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<KdsOutbox(order_id={self.order_id}, attempts={self.attempts})>"
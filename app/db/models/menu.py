@@ -1,13 +1,20 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.db.session import Base
 
 class Menu(Base):
+    """Versioned catalog snapshot per channel, deduplicated by content hash."""
     __tablename__ = "menus"
+    __table_args__ = (
+        UniqueConstraint("channel", "content_hash", name="uq_menus_channel_hash"),
+        Index("idx_menus_channel_latest", "channel", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     provider = Column(String, default="rista", nullable=False)
+    channel = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)
     data = Column(JSONB, nullable=False)
 
     created_at = Column(
@@ -15,6 +22,7 @@ class Menu(Base):
         server_default=func.now(),
         nullable=False,
     )
+    # Bumped whenever Rista serves this exact content again
     updated_at = Column(
         DateTime(timezone=True),
         onupdate=func.now(),
@@ -22,4 +30,4 @@ class Menu(Base):
     )
 
     def __repr__(self):
-        return f"<Menu(id={self.id}, provider={self.provider})>"
+        return f"<Menu(id={self.id}, provider={self.provider}, channel={self.channel}, hash={self.content_hash})>"
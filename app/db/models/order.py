@@ -37,6 +37,9 @@ class Order(Base):
         Index("idx_orders_kds_sync", "payment_status", "kds_status"),
         Index("idx_orders_items_gin", "items", postgresql_using="gin"),
     )
+    # Server-generated columns (id, created_at, updated_at) come back via
+    # INSERT/UPDATE ... RETURNING, so writes never need a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(String, index=True, nullable=False)
@@ -0,0 +1,35 @@
+"""
+Counts SQL statements sent to Postgres per request (or any other scope).
+
+A cursor-execute listener on the engine bumps the counter of the current
+context; start_counting() opens a new scope. With DEBUG_MODE on, every
+response carries the count in an X-DB-Queries header.
+"""
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+
+# A one-element list so statements run in copied contexts (tasks, greenlets) still count
+_query_count: ContextVar[Optional[List[int]]] = ContextVar("db_query_count", default=None)
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install(engine: AsyncEngine) -> None:
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _on_execute):
+        event.listen(engine.sync_engine, "before_cursor_execute", _on_execute)
+
+
+def start_counting() -> List[int]:
+    """Starts a new count for the current context; read it from the returned list."""
+    counter = [0]
+    _query_count.set(counter)
+    return counter
@@ -0,0 +1,35 @@
+"""
+In-place upgrades for tables that create_all already made in an older shape.
+
+create_all only creates missing tables, so columns and constraints added to an
+existing table are applied here, at startup, right after it. Every statement
+is idempotent and safe when several workers start at once. The same SQL can be
+run by hand before a deploy (see deploy.md).
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+SCHEMA_UPGRADES = (
+    # menus: per-channel snapshots deduplicated by content hash (rows from before had neither and are unusable)
+    "ALTER TABLE menus ADD COLUMN IF NOT EXISTS channel VARCHAR",
+    "ALTER TABLE menus ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "DELETE FROM menus WHERE channel IS NULL OR content_hash IS NULL",
+    "ALTER TABLE menus ALTER COLUMN channel SET NOT NULL",
+    "ALTER TABLE menus ALTER COLUMN content_hash SET NOT NULL",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_menus_channel_hash') THEN
+            ALTER TABLE menus ADD CONSTRAINT uq_menus_channel_hash UNIQUE (channel, content_hash);
+        END IF;
+    EXCEPTION WHEN duplicate_table OR duplicate_object THEN
+        NULL;  -- another worker added it first
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_menus_channel_latest ON menus (channel, updated_at)",
+)
+
+
+async def upgrade_schema(conn: AsyncConnection) -> None:
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
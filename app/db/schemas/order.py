@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List
+from typing import List, Optional
 from app.db.models.order import OrderType
 
 class OrderItemCreate(BaseModel):
@@ -14,6 +14,38 @@ class OrderCreateRequest(BaseModel):
     total_amount_include_tax: float
     total_amount_exclude_tax: float
 
+class OrderQuoteRequest(BaseModel):
+    channel: str
+    items: List[OrderItemCreate]
+
+class QuoteTax(BaseModel):
+    name: Optional[str]
+    percentage: float
+    amount_included: float
+    amount_excluded: float
+
+class QuoteLine(BaseModel):
+    sku_code: str
+    item_name: Optional[str]
+    quantity: int
+    unit_price: float
+    line_amount: float
+    tax_included: float
+    tax_excluded: float
+    taxes: List[QuoteTax]
+
+class OrderQuoteResponse(BaseModel):
+    channel: str
+    catalog_version: str
+    lines: List[QuoteLine]
+    item_total: float
+    tax_included: float
+    tax_excluded: float
+    taxes: List[QuoteTax]
+    # What POST /orders/ would charge for this cart
+    total_amount_exclude_tax: float
+    total_amount_include_tax: float
+
 class OrderCreateResponse(BaseModel):
     order_id: str
     amount_with_tax: float = Field(serialization_alias="total_amount_include_tax")
@@ -21,4 +53,18 @@ class OrderCreateResponse(BaseModel):
     kot_code: str
     order_type: OrderType
 
-    model_config = ConfigDict(populate_by_name=True)
\ No newline at end of file
+    model_config = ConfigDict(populate_by_name=True)
+
+class OrderBatchCreateRequest(BaseModel):
+    orders: List[OrderCreateRequest] = Field(..., min_length=1, max_length=100)
+
+class OrderBatchResult(BaseModel):
+    index: int
+    status: str  # "created" | "rejected"
+    order: Optional[OrderCreateResponse] = None
+    error: Optional[str] = None
+
+class OrderBatchCreateResponse(BaseModel):
+    created: int
+    rejected: int
+    results: List[OrderBatchResult]
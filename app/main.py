@@ -1,14 +1,25 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
 import redis.asyncio as redis
 
 from app.db.session import engine, Base
+from app.db import query_counter
+from app.db.schema_upgrades import upgrade_schema
 from .routers import catalog, order, admin, dashboard
 from .routers.payment import payment
 from app.core.config import settings
+from app.core import metrics
+from app.services.catalog_service import CatalogService
+from app.utils.rista import RistaClient, create_rista_breaker, create_rista_http_client
+from app.core.warmup import warm_up, configured_channels
+from app.services.catalog_events import run_catalog_listener
+from app.services.kds_outbox import run_kds_outbox
+from app.services.kds_sweeper import run_kds_sweeper
 
 # Configure Logging
 logging.basicConfig(
@@ -29,11 +40,14 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 FastAPI application starting up...")
 
     app.state.http_client = httpx.AsyncClient()
-    logger.info("HTTP client initialized successfully.")
+    # One Rista client per worker: own connection pool, cached auth tokens
+    app.state.rista_client = RistaClient(create_rista_http_client())
+    logger.info("HTTP clients initialized successfully.")
 
-    # Create tables
+    # Create tables, then bring tables created by older versions up to date
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await upgrade_schema(conn)
     logger.info("PostgreSQL tables ensured.")
 
     # Redis setup...
@@ -43,17 +57,63 @@ async def lifespan(app: FastAPI):
             decode_responses=True
         )
         await app.state.redis_client.ping()
+        # Binary-safe connection for the compact catalog format
+        app.state.redis_binary_client = redis.from_url(settings.REDIS_HOST)
         logger.info("Successfully connected to Redis.")
     except Exception as e:
         logger.error(f"Error connecting to Redis: {e}")
         app.state.redis_client = None
+        app.state.redis_binary_client = None
+    # Fail fast on Rista calls while it is degraded; the state is shared through Redis
+    app.state.rista_client.breaker = create_rista_breaker(app.state.redis_client)
+
+    # Warm-up: the server only accepts connections once the lifespan yields, so no request waits on a cold start
+    app.state.warmup = None
+    if settings.WARMUP_ENABLED:
+        app.state.warmup = await warm_up(
+            app.state.redis_client, app.state.http_client, app.state.rista_client, app.state.redis_binary_client
+        )
+
+    # Background catalog refresher (stale-while-revalidate) and cross-worker invalidation
+    app.state.catalog_refresher = None
+    app.state.catalog_listener = None
+    if app.state.redis_client:
+        channels = configured_channels()
+        app.state.catalog_refresher = asyncio.create_task(
+            CatalogService.run_refresher(
+                app.state.redis_client,
+                app.state.rista_client,
+                channels,
+                app.state.redis_binary_client,
+            )
+        )
+        logger.info(f"Catalog refresher started for channels: {channels}")
+        app.state.catalog_listener = asyncio.create_task(run_catalog_listener(app.state.redis_client))
+
+    # KDS outbox workers: post paid orders to Rista off the request path; the
+    # sweeper re-queues FAILED and abandoned posts. Neither needs Redis: paid
+    # orders are queued in Postgres whether or not it is up.
+    app.state.kds_outbox = None
+    if settings.KDS_OUTBOX_CONCURRENCY > 0:
+        app.state.kds_outbox = asyncio.create_task(
+            run_kds_outbox(app.state.redis_client, app.state.rista_client, app.state.redis_binary_client)
+        )
+        logger.info(f"KDS outbox started with {settings.KDS_OUTBOX_CONCURRENCY} workers.")
+    app.state.kds_sweeper = asyncio.create_task(run_kds_sweeper(app.state.redis_client))
 
     logger.info("FastAPI startup complete.")
     yield
 
+    for task in (
+            app.state.catalog_refresher, app.state.catalog_listener, app.state.kds_outbox, app.state.kds_sweeper
+    ):
+        if task:
+            task.cancel()
     await app.state.http_client.aclose()
+    await app.state.rista_client.aclose()
     if app.state.redis_client:
         await app.state.redis_client.close()
+        await app.state.redis_binary_client.close()
         logger.info("Redis connection closed.")
     logger.info("Resources cleaned up. Application shutting down.")
 
@@ -69,6 +129,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.DEBUG_MODE:
+    query_counter.install(engine)
+
+    @app.middleware("http")
+    async def count_db_queries(request: Request, call_next):
+        counter = query_counter.start_counting()
+        response = await call_next(request)
+        response.headers[query_counter.QUERY_COUNT_HEADER] = str(counter[0])
+        return response
+
 
 @app.get("/")
 def read_root():
@@ -76,6 +146,18 @@ def read_root():
     return {"message": "Welcome to the KTR, The best South Indian restaurant!"}
 
 
+@app.get("/health")
+def health(request: Request):
+    """Health check, with this worker's startup warm-up report."""
+    return {"status": "ok", "warmup": getattr(request.app.state, "warmup", None)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms of this worker, in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 # Routers
 app.include_router(catalog.router, prefix="/catalog", tags=["catalog"])
 app.include_router(order.router, prefix="/orders", tags=["orders"])
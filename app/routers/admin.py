@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 
-from app.core.dependencies import get_db
+from app.core.dependencies import get_db, get_catalog_service
+from app.services.catalog_service import CatalogService
 from app.db.models.edc_config import EdcConfig
 from app.db.models.order import Order
 from typing import List
@@ -65,3 +66,32 @@ async def get_transactions(
             provider_code=o.provider_code
         ) for o in orders
     ]
+
+class AvailabilityUpdate(BaseModel):
+    channel: str
+    sku_codes: List[str]
+    available: bool
+
+class AvailabilityResponse(BaseModel):
+    channel: str
+    disabled_sku_codes: List[str]
+
+@router.get("/availability", response_model=AvailabilityResponse)
+async def get_availability(
+    channel: str,
+    service: CatalogService = Depends(get_catalog_service)
+):
+    skus = await service.get_disabled_skus(channel)
+    return AvailabilityResponse(channel=channel, disabled_sku_codes=sorted(skus))
+
+@router.post("/availability", response_model=AvailabilityResponse)
+async def update_availability(
+    request: AvailabilityUpdate,
+    service: CatalogService = Depends(get_catalog_service)
+):
+    """
+    Marks SKUs out of stock (available=false) or back in stock. Applied on top
+    of the cached catalog by every worker; the catalog itself is not refetched.
+    """
+    skus = await service.set_availability(request.channel, request.sku_codes, request.available)
+    return AvailabilityResponse(channel=request.channel, disabled_sku_codes=sorted(skus))
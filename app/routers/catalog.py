@@ -1,35 +1,122 @@
 import logging
-import redis.asyncio as redis
-from fastapi import APIRouter, Depends
-from app.core.dependencies import get_catalog_service, get_redis_client
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from app.core.config import settings
+from app.core.dependencies import get_catalog_service
 from app.services.catalog_service import CatalogService
+from app.services.catalog_cache import brotli, SHARD_HEADER
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _etag_matches(if_none_match: str | None, version: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/").strip('"') == version:
+            return True
+    return False
+
+def _negotiate_encoding(accept_encoding: str | None) -> str:
+    """Picks br, then gzip, from an Accept-Encoding header; identity otherwise."""
+    if not accept_encoding:
+        return "identity"
+    prefs = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if prefs.get(encoding, prefs.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
 @router.get("/")
 async def get_catalog(
         channel: str,
+        if_none_match: str | None = Header(default=None),
+        accept_encoding: str | None = Header(default=None),
         service: CatalogService = Depends(get_catalog_service)
 ):
     """
     Get catalog for a specific channel.
+    Serves pre-serialized (and gzip/brotli pre-compressed) bytes cached per
+    catalog version. Out-of-stock SKUs are marked inactive. Supports conditional
+    GET: the ETag is the catalog content hash (plus the availability overlay),
+    and a matching If-None-Match returns 304 without touching the body.
+    """
+    headers = {"Cache-Control": settings.CATALOG_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+    if if_none_match and (version := await service.get_version(channel)):
+        if _etag_matches(if_none_match, version):
+            headers["ETag"] = f'"{version}"'
+            return Response(status_code=304, headers=headers)
+
+    entry = await service.get_available_entry(channel)
+    encoding = _negotiate_encoding(accept_encoding)
+    body = await entry.encoded_body(encoding)
+
+    if encoding == "identity":
+        headers["ETag"] = f'"{entry.version}"'
+    else:
+        # Same catalog version, different bytes: weak validator per RFC 9110
+        headers["ETag"] = f'W/"{entry.version}"'
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _shard_response(shard: bytes | None, version: str, if_none_match: str | None) -> Response:
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    headers = {"ETag": f'"{version}"', "Cache-Control": settings.CATALOG_CACHE_CONTROL}
+    if _etag_matches(if_none_match, version):
+        return Response(status_code=304, headers=headers)
+    return Response(content=shard, media_type="application/json", headers=headers)
+
+@router.get("/categories")
+async def get_catalog_categories(
+        channel: str,
+        if_none_match: str | None = Header(default=None),
+        service: CatalogService = Depends(get_catalog_service)
+):
+    """
+    Category list (with item counts) and taxTypes for a channel, without items.
     """
-    return await service.get_catalog(channel)
+    shard, version = await service.get_shard(channel, SHARD_HEADER)
+    return _shard_response(shard, version, if_none_match)
+
+@router.get("/categories/{category_id}")
+async def get_catalog_category(
+        category_id: str,
+        channel: str,
+        if_none_match: str | None = Header(default=None),
+        service: CatalogService = Depends(get_catalog_service)
+):
+    """
+    A single category and its items.
+    """
+    if category_id == SHARD_HEADER:
+        raise HTTPException(status_code=404, detail="Category not found")
+    shard, version = await service.get_shard(channel, category_id)
+    return _shard_response(shard, version, if_none_match)
 
 @router.delete("/cache")
 async def clear_catalog_cache(
         channel: str,
-        redis_client: redis.Redis = Depends(get_redis_client)
+        service: CatalogService = Depends(get_catalog_service)
 ):
     """
     Manually clear catalog cache for a specific channel.
     """
-    cache_key = f"{channel}_catalog_data"
-    deleted = await redis_client.delete(cache_key)
-
-    if deleted > 0:
+    if await service.clear_cache(channel):
         logger.info(f"Catalog cache cleared for channel '{channel}'")
         return {
             "status": "success",
@@ -46,20 +133,22 @@ async def clear_catalog_cache(
 
 @router.get("/cache-stats")
 async def get_cache_stats(
-        redis_client: redis.Redis = Depends(get_redis_client)
+        service: CatalogService = Depends(get_catalog_service)
 ):
     """
     Get statistics about cached catalogs.
     """
     try:
-        keys = await redis_client.keys("*_catalog_data")
-        cached_channels = [k.replace("_catalog_data", "") for k in keys]
+        stats = await service.get_cache_stats()
+        cached_channels = [c["channel"] for c in stats["channels"] if c["cached"]]
 
         return {
             "status": "success",
             "total_cached_channels": len(cached_channels),
             "channels": cached_channels,
-            "cache_status": "healthy" if keys else "empty"
+            "cache_status": "healthy" if cached_channels else "empty",
+            "details": stats["channels"],
+            "l1": stats["worker"]
         }
     except Exception as e:
         logger.error(f"Error getting cache stats: {e}")
@@ -1,7 +1,12 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
-from app.db.schemas.order import OrderCreateRequest, OrderCreateResponse
-from app.core.dependencies import get_order_service, get_db
+from app.db.schemas.order import (
+    OrderCreateRequest, OrderCreateResponse,
+    OrderBatchCreateRequest, OrderBatchCreateResponse, OrderBatchResult,
+    OrderQuoteRequest, OrderQuoteResponse,
+)
+from app.core.dependencies import get_order_service, get_db, get_idempotency
+from app.services.idempotency import Idempotency
 from app.services.order_service import OrderService
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -12,35 +17,98 @@ router = APIRouter()
 async def create_order(
         request: OrderCreateRequest,
         service: OrderService = Depends(get_order_service),
+        idempotency: Idempotency = Depends(get_idempotency),
 ):
     """
     Create a new order.
     Delegates complex logic (Tax calc, KOT generation, DB save) to OrderService.
+    Retries carrying the same Idempotency-Key return the first order instead of creating another.
     """
-    try:
-        new_order = await service.create_order(request)
+    async def _create() -> OrderCreateResponse:
+        try:
+            new_order = await service.create_order(request)
+
+            return OrderCreateResponse(
+                order_id=new_order.order_id,
+                amount_with_tax=new_order.total_amount_include_tax,
+                amount_without_tax=new_order.total_amount_exclude_tax,
+                kot_code=new_order.kot_code,
+                order_type=new_order.order_type
+            )
+
+        except ValueError as e:
+            # Catch validation errors (e.g. Invalid SKU)
+            logger.warning(f"Order validation failed: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            logger.error(f"System error creating order: {e}", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Could not process order."
+            )
 
-        return OrderCreateResponse(
-            order_id=new_order.order_id,
-            amount_with_tax=new_order.total_amount_include_tax,
-            amount_without_tax=new_order.total_amount_exclude_tax,
-            kot_code=new_order.kot_code,
-            order_type=new_order.order_type
+    return await idempotency.run("orders", request, _create)
+
+@router.post("/batch", response_model=OrderBatchCreateResponse)
+async def create_orders_batch(
+        request: OrderBatchCreateRequest,
+        service: OrderService = Depends(get_order_service),
+):
+    """
+    Create several orders in one call (kiosks flushing a queue, load tests).
+    Each order is validated on its own; invalid ones are reported per index
+    and the rest are saved together.
+    """
+    try:
+        outcomes = await service.create_orders_batch(request.orders)
+    except Exception as e:
+        logger.error(f"System error creating order batch: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Could not process orders."
         )
 
+    results = []
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, ValueError):
+            logger.warning(f"Batch order {i} validation failed: {outcome}")
+            results.append(OrderBatchResult(index=i, status="rejected", error=str(outcome)))
+            continue
+        results.append(OrderBatchResult(
+            index=i,
+            status="created",
+            order=OrderCreateResponse(
+                order_id=outcome["order_id"],
+                amount_with_tax=outcome["total_amount_include_tax"],
+                amount_without_tax=outcome["total_amount_exclude_tax"],
+                kot_code=outcome["kot_code"],
+                order_type=outcome["order_type"]
+            )
+        ))
+
+    created = sum(1 for r in results if r.status == "created")
+    return OrderBatchCreateResponse(created=created, rejected=len(results) - created, results=results)
+
+@router.post("/quote", response_model=OrderQuoteResponse)
+async def quote_order(
+        request: OrderQuoteRequest,
+        service: OrderService = Depends(get_order_service),
+):
+    """
+    Price a cart without creating an order.
+    Same pricing and tax rules as POST /orders/; reads only the cached catalog,
+    so cart edits cost no database work and consume no KOT numbers.
+    """
+    try:
+        return OrderQuoteResponse(**await service.quote_order(request))
     except ValueError as e:
-        # Catch validation errors (e.g. Invalid SKU)
-        logger.warning(f"Order validation failed: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
-    except Exception as e:
-        logger.error(f"System error creating order: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Could not process order."
-        )
 
 # --- DASHBOARD ENDPOINTS ---
 
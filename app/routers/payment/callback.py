@@ -5,9 +5,10 @@ from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
 import httpx
 import redis.asyncio as redis
 
-from app.core.dependencies import get_http_client, get_redis_client
+from app.core.dependencies import get_http_client, get_redis_client, get_binary_redis_client, get_rista_client
 from app.utils.phonepe import verify_phonepe_callback_hash
 from app.services.payment_service import PaymentService
+from app.utils.rista import RistaClient
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -17,7 +18,9 @@ async def handle_callback(
         request: Request,
         background_tasks: BackgroundTasks,
         http_client: httpx.AsyncClient = Depends(get_http_client),
-        redis_client: redis.Redis = Depends(get_redis_client)
+        redis_client: redis.Redis = Depends(get_redis_client),
+        rista_client: RistaClient = Depends(get_rista_client),
+        blob_redis_client: redis.Redis | None = Depends(get_binary_redis_client)
 ):
     x_verify = request.headers.get("X-VERIFY")
     try:
@@ -51,7 +54,9 @@ async def handle_callback(
             code=code,
             payload=payload,
             http_client=http_client,
-            redis_client=redis_client
+            redis_client=redis_client,
+            rista_client=rista_client,
+            blob_redis_client=blob_redis_client
         )
     else:
         logger.warning("Callback received without merchantOrderId")
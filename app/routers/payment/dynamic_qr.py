@@ -1,23 +1,28 @@
 from fastapi import APIRouter, Depends
 from app.db.schemas.payment import QRInitiateRequest, QRInitiateResponse, StatusResponse
 from app.services.payment_service import PaymentService
-from app.core.dependencies import get_payment_service
+from app.core.dependencies import get_payment_service, get_idempotency
+from app.services.idempotency import Idempotency
 
 router = APIRouter()
 
 @router.post("/init", response_model=QRInitiateResponse)
 async def initiate_qr(
         request: QRInitiateRequest,
-        service: PaymentService = Depends(get_payment_service)
+        service: PaymentService = Depends(get_payment_service),
+        idempotency: Idempotency = Depends(get_idempotency)
 ):
-    order = await service.initiate_qr(request.order_id, request.amount_paise, request.store_id)
+    async def _initiate() -> QRInitiateResponse:
+        order = await service.initiate_qr(request.order_id, request.amount_paise, request.store_id)
 
-    return QRInitiateResponse(
-        order_id=order.order_id,
-        transaction_id=order.provider_txn_id or order.order_id,
-        qr_string=order.qr_string,
-        expires_at=order.qr_expires_at
-    )
+        return QRInitiateResponse(
+            order_id=order.order_id,
+            transaction_id=order.provider_txn_id or order.order_id,
+            qr_string=order.qr_string,
+            expires_at=order.qr_expires_at
+        )
+
+    return await idempotency.run("payments_qr_init", request, _initiate)
 
 @router.get("/status/{order_id}", response_model=StatusResponse)
 async def check_qr_status(
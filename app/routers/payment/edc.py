@@ -1,32 +1,37 @@
 from fastapi import APIRouter, Depends
 from app.db.schemas.payment import EDCInitiateRequest, EDCInitiateResponse, EDCStatusResponse
 from app.services.payment_service import PaymentService
-from app.core.dependencies import get_payment_service
+from app.core.dependencies import get_payment_service, get_idempotency
+from app.services.idempotency import Idempotency
 
 router = APIRouter()
 
 @router.post("/init", response_model=EDCInitiateResponse)
 async def initiate_edc(
         request: EDCInitiateRequest,
-        service: PaymentService = Depends(get_payment_service)
+        service: PaymentService = Depends(get_payment_service),
+        idempotency: Idempotency = Depends(get_idempotency)
 ):
-    order = await service.initiate_edc(
-        request.order_id,
-        request.amount_paise,
-        request.store_id
-    )
+    async def _initiate() -> EDCInitiateResponse:
+        order = await service.initiate_edc(
+            request.order_id,
+            request.amount_paise,
+            request.store_id
+        )
 
-    provider_msg = "Request sent to Pine Labs Terminal"
-    if order.provider_resp:
-        provider_msg = order.provider_resp.get("ResponseMessage", provider_msg)
+        provider_msg = "Request sent to Pine Labs Terminal"
+        if order.provider_resp:
+            provider_msg = order.provider_resp.get("ResponseMessage", provider_msg)
 
-    return EDCInitiateResponse(
-        order_id=order.order_id,
-        transaction_id=order.order_id,
-        amount=request.amount_paise,
-        message=provider_msg,
-        provider="Pine Labs EDC"
-    )
+        return EDCInitiateResponse(
+            order_id=order.order_id,
+            transaction_id=order.order_id,
+            amount=request.amount_paise,
+            message=provider_msg,
+            provider="Pine Labs EDC"
+        )
+
+    return await idempotency.run("payments_edc_init", request, _initiate)
 
 @router.get("/status/{order_id}", response_model=EDCStatusResponse)
 async def check_edc_status(
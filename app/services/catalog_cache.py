@@ -0,0 +1,255 @@
+"""
+Per-worker in-memory (L1) cache for decoded catalogs.
+
+Redis stays the shared source of truth. This layer only keeps the already
+decoded catalog per channel so hot requests skip the Redis GET and the
+json.loads of the whole menu. Entries are revalidated against the version
+stored in Redis once their TTL has passed.
+"""
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import AbstractSet, Any, Dict, FrozenSet, List, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: br responses are skipped without it
+    brotli = None
+
+from app.core.config import settings
+from app.services.catalog_index import CatalogIndex
+
+
+class CatalogEntry:
+    """A decoded catalog for one channel. Treat `data` as read-only — it is shared."""
+
+    __slots__ = ("channel", "version", "data", "fetched_at", "checked_at", "_index", "_bodies", "_shards", "_overlay")
+
+    def __init__(
+            self,
+            channel: str,
+            version: str,
+            data: Dict[str, Any],
+            fetched_at: Optional[float] = None,
+            body: Optional[bytes] = None,
+    ):
+        self.channel = channel
+        self.version = version
+        self.data = data
+        # Ready-made response bytes per content-coding ("identity", "gzip", "br")
+        self._bodies: Dict[str, bytes] = {"identity": body} if body is not None else {}
+        # Wall-clock time of the Rista fetch that produced this version (drives the soft TTL)
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self.checked_at = time.monotonic()
+        self._index: Optional[CatalogIndex] = None
+        self._shards: Optional[Dict[str, bytes]] = None
+        # Last availability-overlaid variant, reused while the disabled set is unchanged
+        self._overlay: Optional["CatalogEntry"] = None
+
+    @property
+    def index(self) -> CatalogIndex:
+        """Lookup tables for this version, built on first use."""
+        if self._index is None:
+            self._index = CatalogIndex.build(self.data, self.version)
+        return self._index
+
+    @property
+    def body(self) -> bytes:
+        """The serialized catalog, as stored in Redis."""
+        if "identity" not in self._bodies:
+            self._bodies["identity"] = json.dumps(self.data, separators=(",", ":")).encode("utf-8")
+        return self._bodies["identity"]
+
+    @property
+    def shards(self) -> Dict[str, bytes]:
+        """
+        The catalog split for partial reads: a "header" field (categories,
+        taxTypes, version) plus one field per categoryId holding its items.
+        """
+        if self._shards is None:
+            self._shards = build_shards(self.data, self.version)
+        return self._shards
+
+    def add_encoded(self, encoding: str, data: bytes) -> None:
+        """Seeds a ready-made body for a content-coding (e.g. a gzip blob read from Redis)."""
+        self._bodies[encoding] = data
+
+    async def encoded_body(self, encoding: str) -> bytes:
+        """Response bytes for a content-coding, compressed off the event loop on first use."""
+        if (cached := self._bodies.get(encoding)) is not None:
+            return cached
+        if encoding == "gzip":
+            encoded = await asyncio.to_thread(gzip.compress, self.body, settings.CATALOG_GZIP_LEVEL)
+        elif encoding == "br" and brotli is not None:
+            encoded = await asyncio.to_thread(brotli.compress, self.body, quality=settings.CATALOG_BROTLI_QUALITY)
+        else:
+            return self.body
+        self._bodies[encoding] = encoded
+        return encoded
+
+    def with_overlay(self, disabled_skus: AbstractSet[str]) -> "CatalogEntry":
+        """
+        This catalog with the given SKUs marked out of stock. Returns self when
+        nothing is disabled; otherwise a derived entry whose version combines
+        the catalog version and the disabled set, so ETags change with either.
+        """
+        if not disabled_skus:
+            return self
+        version = overlay_version(self.version, disabled_skus)
+        if self._overlay is not None and self._overlay.version == version:
+            return self._overlay
+
+        data = dict(self.data)
+        data["items"] = [
+            {**item, "status": "Inactive", "outOfStock": True} if str(item.get("skuCode")) in disabled_skus else item
+            for item in self.data.get("items", [])
+        ]
+        variant = CatalogEntry(self.channel, version, data, fetched_at=self.fetched_at)
+        self._overlay = variant
+        return variant
+
+
+def overlay_version(version: str, disabled_skus: AbstractSet[str]) -> str:
+    if not disabled_skus:
+        return version
+    digest = hashlib.sha256("\n".join(sorted(disabled_skus)).encode("utf-8")).hexdigest()[:8]
+    return f"{version}-{digest}"
+
+
+SHARD_HEADER = "header"
+
+
+def build_shards(catalog_data: Dict[str, Any], version: str) -> Dict[str, bytes]:
+    items_by_category: Dict[str, List[Dict[str, Any]]] = {}
+    for item in catalog_data.get("items", []):
+        items_by_category.setdefault(item.get("categoryId"), []).append(item)
+
+    shards: Dict[str, bytes] = {}
+    for category in catalog_data.get("categories", []):
+        category_id = category.get("categoryId")
+        if category_id is None:
+            continue
+        shard = {"version": version, "category": category, "items": items_by_category.get(category_id, [])}
+        shards[category_id] = json.dumps(shard, separators=(",", ":")).encode("utf-8")
+
+    header = {
+        "version": version,
+        "categories": [
+            {**category, "itemCount": len(items_by_category.get(category.get("categoryId"), []))}
+            for category in catalog_data.get("categories", [])
+        ],
+        "taxTypes": catalog_data.get("taxTypes", []),
+    }
+    shards[SHARD_HEADER] = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return shards
+
+
+class CatalogL1Cache:
+    """Bounded LRU of CatalogEntry objects keyed by channel."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CatalogEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Per-channel [hits, misses] in this worker; kept across evictions
+        self._channel_counts: Dict[str, List[int]] = {}
+
+    def get(self, channel: str) -> Optional[CatalogEntry]:
+        entry = self._entries.get(channel)
+        if entry is not None:
+            self._entries.move_to_end(channel)
+        return entry
+
+    def is_fresh(self, entry: CatalogEntry) -> bool:
+        return time.monotonic() - entry.checked_at < self.ttl_seconds
+
+    def record_hit(self, channel: str) -> None:
+        self.hits += 1
+        self._channel_counts.setdefault(channel, [0, 0])[0] += 1
+
+    def record_miss(self, channel: str) -> None:
+        self.misses += 1
+        self._channel_counts.setdefault(channel, [0, 0])[1] += 1
+
+    def channel_stats(self, channel: str) -> Dict[str, Any]:
+        hits, misses = self._channel_counts.get(channel, (0, 0))
+        entry = self._entries.get(channel)
+        return {"version": entry.version if entry else None, "hits": hits, "misses": misses}
+
+    def touch(self, entry: CatalogEntry) -> None:
+        """Mark an entry as just revalidated against Redis."""
+        entry.checked_at = time.monotonic()
+
+    def put(self, entry: CatalogEntry) -> None:
+        self._entries[entry.channel] = entry
+        self._entries.move_to_end(entry.channel)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, channel: str) -> None:
+        self._entries.pop(channel, None)
+
+    def channels(self) -> List[str]:
+        return list(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "channels": {channel: self.channel_stats(channel) for channel in self._channel_counts},
+        }
+
+
+class AvailabilityOverlay:
+    """
+    Per-worker copy of each channel's disabled-SKU set. Held for the L1 TTL and
+    dropped early by "availability" catalog events.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._sets: Dict[str, tuple[FrozenSet[str], float]] = {}
+
+    def get(self, channel: str, allow_stale: bool = False) -> Optional[FrozenSet[str]]:
+        cached = self._sets.get(channel)
+        if cached is None:
+            return None
+        skus, checked_at = cached
+        if allow_stale or time.monotonic() - checked_at < self.ttl_seconds:
+            return skus
+        return None
+
+    def put(self, channel: str, skus: AbstractSet[str]) -> FrozenSet[str]:
+        frozen = frozenset(skus)
+        self._sets[channel] = (frozen, time.monotonic())
+        return frozen
+
+    def invalidate(self, channel: str) -> None:
+        self._sets.pop(channel, None)
+
+    def clear(self) -> None:
+        self._sets.clear()
+
+
+catalog_l1_cache = CatalogL1Cache(
+    max_entries=settings.CATALOG_L1_MAX_ENTRIES,
+    ttl_seconds=settings.CATALOG_L1_TTL_SECONDS,
+)
+
+availability_overlay = AvailabilityOverlay(ttl_seconds=settings.CATALOG_L1_TTL_SECONDS)
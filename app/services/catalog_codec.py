@@ -0,0 +1,66 @@
+"""
+Binary storage format for cached catalogs.
+
+    b"KC" | format version (1 byte) | codec (1 byte) | payload
+
+The payload is the catalog JSON, compressed with the codec. Readers return
+None for anything they cannot decode (no header, a newer format version,
+a codec whose library is missing), and callers fall back to the legacy
+plain-JSON key, so old and new workers can coexist during a rollout.
+"""
+import gzip
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd blobs are written/read only when installed
+    zstandard = None
+
+MAGIC = b"KC"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+CODEC_JSON = 0
+CODEC_GZIP = 1
+CODEC_ZSTD = 2
+
+CODECS = {"json": CODEC_JSON, "gzip": CODEC_GZIP, "zstd": CODEC_ZSTD}
+
+
+def available(codec: int) -> bool:
+    return codec != CODEC_ZSTD or zstandard is not None
+
+
+def encode(body: bytes, codec: int, level: int = 6) -> bytes:
+    """Wraps serialized catalog JSON in the versioned binary format."""
+    if codec == CODEC_GZIP:
+        payload = gzip.compress(body, level)
+    elif codec == CODEC_ZSTD and zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=level).compress(body)
+    else:
+        codec, payload = CODEC_JSON, body
+    return MAGIC + bytes((FORMAT_VERSION, codec)) + payload
+
+
+def header(blob: bytes) -> Optional[tuple[int, int]]:
+    """(format version, codec) if the blob is in a format this worker understands."""
+    if len(blob) < HEADER_SIZE or blob[:2] != MAGIC:
+        return None
+    version, codec = blob[2], blob[3]
+    if version > FORMAT_VERSION or codec not in CODECS.values() or not available(codec):
+        return None
+    return version, codec
+
+
+def decode(blob: bytes) -> Optional[bytes]:
+    """Returns the catalog JSON bytes, or None if the blob is not readable here."""
+    parsed = header(blob)
+    if parsed is None:
+        return None
+    _, codec = parsed
+    payload = blob[HEADER_SIZE:]
+    if codec == CODEC_GZIP:
+        return gzip.decompress(payload)
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
@@ -0,0 +1,100 @@
+"""
+Cross-worker catalog invalidation over Redis pub/sub.
+
+Every catalog change bumps a global generation counter and publishes an
+event. Each worker's listener drops its in-process copy when it sees one.
+A worker that missed messages (gap in generations, or a reconnect) clears
+its whole L1 cache, so it never keeps serving a stale menu. The counter may
+run one generation ahead of the events a worker has read, since the event
+can still be in flight; only a larger gap counts as missed.
+"""
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.services.catalog_cache import availability_overlay, catalog_l1_cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_EVENTS_CHANNEL = "catalog_events"
+CATALOG_GENERATION_KEY = "catalog_generation"
+
+
+async def publish_catalog_event(
+        redis_client: redis.Redis, channel: str, action: str, version: Optional[str] = None
+) -> None:
+    """Announces a catalog change ("refresh" with the new version, "invalidate" or "availability")."""
+    try:
+        # Bump and publish in one MULTI/EXEC, so no worker sees the new generation without its event
+        async with redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(CATALOG_GENERATION_KEY)
+                    generation = int(await pipe.get(CATALOG_GENERATION_KEY) or 0) + 1
+                    event = {"channel": channel, "action": action, "version": version, "generation": generation}
+                    pipe.multi()
+                    pipe.set(CATALOG_GENERATION_KEY, generation)
+                    pipe.publish(CATALOG_EVENTS_CHANNEL, json.dumps(event))
+                    await pipe.execute()
+                    return
+                except redis.WatchError:
+                    # Another worker published in between: number this event after theirs
+                    continue
+    except Exception as e:
+        logger.warning(f"Catalog event publish failed for channel '{channel}': {e}")
+
+
+def _apply_event(event: Dict[str, Any], last_generation: Optional[int]) -> int:
+    generation = int(event.get("generation", 0))
+    if last_generation is not None and generation > last_generation + 1:
+        logger.warning(f"Missed catalog events ({last_generation} -> {generation}), clearing in-process catalogs.")
+        catalog_l1_cache.clear()
+        availability_overlay.clear()
+    elif event.get("action") == "availability":
+        # Only the disabled-SKU set changed; the decoded catalog stays valid
+        availability_overlay.invalidate(event.get("channel"))
+    else:
+        channel = event.get("channel")
+        entry = catalog_l1_cache.get(channel)
+        # Keep our copy only if it already is the announced version
+        if entry is not None and (event.get("action") != "refresh" or entry.version != event.get("version")):
+            catalog_l1_cache.invalidate(channel)
+            logger.info(f"Dropped in-process catalog for channel '{channel}' ({event.get('action')}).")
+    return max(generation, last_generation or 0)
+
+
+async def _catch_up(redis_client: redis.Redis, last_generation: Optional[int]) -> int:
+    generation = int(await redis_client.get(CATALOG_GENERATION_KEY) or 0)
+    if last_generation is not None and generation == last_generation + 1:
+        # Its event may still be on the way on the pub/sub connection; a later event reveals a real gap
+        return last_generation
+    if last_generation is not None and generation > last_generation:
+        logger.warning(f"Catalog generation moved {last_generation} -> {generation} unseen, clearing in-process catalogs.")
+        catalog_l1_cache.clear()
+        availability_overlay.clear()
+    return generation
+
+
+async def run_catalog_listener(redis_client: redis.Redis) -> None:
+    """Subscribes to catalog events for the lifetime of the worker, reconnecting on errors."""
+    last_generation: Optional[int] = None
+    while True:
+        try:
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(CATALOG_EVENTS_CHANNEL)
+                last_generation = await _catch_up(redis_client, last_generation)
+                while True:
+                    message = await pubsub.get_message(timeout=settings.CATALOG_EVENTS_CATCHUP_SECONDS)
+                    if message is None:
+                        last_generation = await _catch_up(redis_client, last_generation)
+                        continue
+                    last_generation = _apply_event(json.loads(message["data"]), last_generation)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Catalog event listener error, reconnecting: {e}")
+            await asyncio.sleep(1)
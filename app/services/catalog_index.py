@@ -0,0 +1,125 @@
+"""
+Precompiled lookup tables for a single catalog version.
+
+Built once per version and shared by the order and KDS paths so neither has
+to rebuild dicts or scan the item list per order line. Building also
+validates every active item: one that cannot produce a valid KDS sale line
+is left out (so orders for it are rejected up front rather than failing at
+KDS after payment) and reported in `problems`.
+"""
+import json
+import math
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from app.services.pricing import SaleLineTemplate
+
+
+def _reason(error: Exception) -> str:
+    return f"missing {error}" if isinstance(error, KeyError) else str(error)
+
+
+class IndexedTax:
+    __slots__ = ("tax_type_id", "name", "percentage", "rate_ppm", "raw")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.tax_type_id = raw["taxTypeId"]
+        self.name = raw["name"]
+        if not isinstance(self.name, str) or not self.name.strip():
+            raise ValueError(f"invalid name {self.name!r}")
+        self.percentage = float(raw["percentage"])
+        if not math.isfinite(self.percentage) or self.percentage < 0:
+            raise ValueError(f"invalid percentage {raw['percentage']!r}")
+        # Rate in parts per million (2.5% -> 25000) for integer paise math
+        self.rate_ppm = round(self.percentage * 10_000)
+        self.raw = raw
+
+
+class IndexedItem:
+    """An active catalog item with the fields the pricing paths need pre-parsed."""
+
+    __slots__ = (
+        "sku_code", "item_name", "price", "price_includes_tax", "tax_type_ids",
+        "unit_paise", "taxes", "exclusive_tax_ppm", "sale_template", "raw",
+    )
+
+    def __init__(self, raw: Dict[str, Any], taxes: Mapping[str, IndexedTax]):
+        self.sku_code = str(raw["skuCode"])
+        self.item_name = raw.get("itemName")
+        self.price = float(raw.get("price", 0.0))
+        if not math.isfinite(self.price) or self.price < 0:
+            raise ValueError(f"invalid price {raw.get('price')!r}")
+        if not isinstance(self.item_name, str) or not self.item_name.strip():
+            raise ValueError("missing itemName")
+        self.price_includes_tax = bool(raw.get("isPriceIncludesTax", False))
+        self.tax_type_ids = tuple(raw.get("taxTypeIds", ()))
+        self.unit_paise = round(self.price * 100)
+        # Resolved tax rows; ids missing from taxTypes are skipped, as they always were
+        self.taxes = tuple(taxes[tax_id] for tax_id in self.tax_type_ids if tax_id in taxes)
+        # Combined rate added on top of the price (0 when the price already includes tax)
+        self.exclusive_tax_ppm = 0 if self.price_includes_tax else sum(tax.rate_ppm for tax in self.taxes)
+        self.raw = raw
+        self.sale_template = SaleLineTemplate(self)
+
+
+class CatalogIndex:
+    """Immutable SKU -> item and taxTypeId -> tax maps for one catalog version."""
+
+    __slots__ = ("version", "items", "taxes", "tax_meta", "problems")
+
+    def __init__(
+            self,
+            version: str,
+            items: Mapping[str, IndexedItem],
+            taxes: Mapping[str, IndexedTax],
+            problems: Optional[Mapping[str, str]] = None,
+    ):
+        self.version = version
+        self.items = MappingProxyType(items)
+        self.taxes = MappingProxyType(taxes)
+        # Raw tax dicts keyed by id, as they appear in the catalog
+        self.tax_meta = MappingProxyType({tax_id: tax.raw for tax_id, tax in taxes.items()})
+        # "sku <code>" / "tax <id>" -> why that entry was left out of the index
+        self.problems = MappingProxyType(dict(problems or {}))
+
+    @classmethod
+    def build(cls, catalog_data: Dict[str, Any], version: str) -> "CatalogIndex":
+        problems: Dict[str, str] = {}
+
+        taxes: Dict[str, IndexedTax] = {}
+        for raw in catalog_data.get("taxTypes", []):
+            try:
+                tax = IndexedTax(raw)
+            except (KeyError, TypeError, ValueError) as e:
+                problems[f"tax {raw.get('taxTypeId')}"] = _reason(e)
+                continue
+            taxes[tax.tax_type_id] = tax
+
+        items: Dict[str, IndexedItem] = {}
+        for raw in catalog_data.get("items", []):
+            if raw.get("status") != "Active" or raw.get("skuCode") is None:
+                continue
+            sku_code = str(raw["skuCode"])
+            # First active item wins, matching the old linear find_item scan
+            if sku_code in items or f"sku {sku_code}" in problems:
+                continue
+            try:
+                rejected = [t for t in raw.get("taxTypeIds", ()) if f"tax {t}" in problems]
+                if rejected:
+                    raise ValueError(f"uses invalid tax {rejected[0]}")
+                item = IndexedItem(raw, taxes)
+                # Dry run of the KDS line: must serialize as strict JSON
+                json.dumps(item.sale_template.line(1).to_rista(), allow_nan=False)
+            except (KeyError, TypeError, ValueError) as e:
+                problems[f"sku {sku_code}"] = _reason(e)
+                continue
+            items[sku_code] = item
+
+        return cls(version, items, taxes, problems)
+
+    def item(self, sku_code: Any) -> Optional[IndexedItem]:
+        return self.items.get(str(sku_code))
+
+    def tax_percentage(self, tax_type_id: str) -> float:
+        tax = self.taxes.get(tax_type_id)
+        return tax.percentage if tax else 0.0
@@ -1,33 +1,371 @@
 import json
+import time
+import asyncio
+import hashlib
 import logging
 import httpx
 import redis.asyncio as redis
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Dict, Any, FrozenSet, Iterable
 from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
 from app.utils.rista import RistaClient
+from app.utils.circuit_breaker import CircuitOpenError
+from app.services.catalog_cache import CatalogEntry, availability_overlay, catalog_l1_cache, overlay_version
+from app.services.catalog_index import CatalogIndex
+from app.services.catalog_events import publish_catalog_event
+from app.services import catalog_codec
+from app.db.session import SessionLocal
+from app.db.models.menu import Menu
 
 logger = logging.getLogger(__name__)
 
+# Registry of channels with a cached catalog, so stats never need KEYS
+CATALOG_CHANNELS_KEY = "catalog_channels"
+
+# Static category images injected into every catalog refresh
+CATEGORY_IMAGES = {
+    "6868ca5dc29c8ed4d3c98dd5": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032823/Idli_oh6wpb.jpg",
+    "68e778dd0c42e107fdf5cf3f": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767786181/360_F_786760607_IwcScz3k7Efj42i1S7mnewhWQXrhAa0o_dnjnqq.jpg",
+    "6868ca5dc29c8ed4d3c98dd4": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032824/Davanagere_Dose_rsju7o.jpg",
+    "6868ca5dc29c8ed4d3c98dd8": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032824/Coffee_f8hx0m.jpg",
+    "6868ca5dc29c8ed4d3c98dd3": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032828/Bengaluru_Dose_bdrozv.jpg",
+    "6868ca5dc29c8ed4d3c98dd7": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032825/Rice_j5hjnu.jpg",
+    "6868ca5dc29c8ed4d3c98dd6": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032827/WadaSnacks_nkhdsn.jpg"
+}
+
+CATEGORY_ORDER = [
+    "6868ca5dc29c8ed4d3c98dd3",  # Davanagere Dose
+    "6868ca5dc29c8ed4d3c98dd4",  # Bengaluru Dose
+    "6868ca5dc29c8ed4d3c98dd5",  # Idli
+    "6868ca5dc29c8ed4d3c98dd7",  # Rice
+    "6868ca5dc29c8ed4d3c98dd6",  # Wada/Snacks
+    "6868ca5dc29c8ed4d3c98dd8",  # Coffee
+    "68e778dd0c42e107fdf5cf3f",  # BEVERAGE
+]
+_CATEGORY_RANK = {cid: rank for rank, cid in enumerate(CATEGORY_ORDER)}
+
+# In-flight catalog loads per channel, shared by every request in this worker
+_inflight_refreshes: Dict[str, asyncio.Task] = {}
+# Fire-and-forget work (snapshot writes) kept referenced until done
+_background_tasks: set[asyncio.Task] = set()
+# Last background refresh attempt per channel (monotonic), to throttle retries while stale
+_last_background_attempt: Dict[str, float] = {}
+
 class CatalogService:
-    def __init__(self, redis_client: redis.Redis, rista_client: RistaClient):
+    def __init__(
+            self,
+            redis_client: redis.Redis | None,
+            rista_client: RistaClient,
+            blob_redis_client: redis.Redis | None = None,
+    ):
         self.redis = redis_client
         self.rista = rista_client
+        # Binary-safe connection (decode_responses=False) for the compact catalog format
+        self.blob_redis = blob_redis_client
 
     async def get_catalog(self, channel: str) -> Dict[str, Any]:
-        cache_key = f"{channel}_catalog_data"
+        return (await self.get_entry(channel)).data
+
+    async def get_catalog_index(self, channel: str) -> CatalogIndex:
+        """SKU and tax lookup tables for the current catalog version of a channel."""
+        return (await self.get_entry(channel)).index
+
+    async def get_available_entry(self, channel: str) -> CatalogEntry:
+        """The catalog as served to kiosks: out-of-stock SKUs marked inactive."""
+        entry = await self.get_entry(channel)
+        return entry.with_overlay(await self.get_disabled_skus(channel))
+
+    async def get_version(self, channel: str) -> str | None:
+        """
+        Current served version (content hash, plus the availability overlay)
+        for a channel, without decoding the catalog. Used to answer conditional GETs.
+        """
+        entry = catalog_l1_cache.get(channel)
+        if entry is not None and catalog_l1_cache.is_fresh(entry):
+            catalog_l1_cache.record_hit(channel)
+            self._refresh_if_stale(entry)
+            version = entry.version
+        else:
+            try:
+                version = await self.redis.hget(f"{channel}_catalog_meta", "version")
+            except Exception as e:
+                logger.error(f"Cache read error for channel '{channel}': {e}", exc_info=True)
+                return None
+        if version is None:
+            return None
+        return overlay_version(version, await self.get_disabled_skus(channel))
+
+    async def get_shard(self, channel: str, field: str) -> tuple[bytes | None, str]:
+        """
+        One field of the sharded catalog (SHARD_HEADER or a categoryId) as
+        ready-made JSON bytes, plus the catalog version. Workers without a
+        fresh in-process copy read just that hash field from Redis instead of
+        loading the whole menu.
+        """
+        if disabled := await self.get_disabled_skus(channel):
+            # Stored shards carry no availability; derive them from the overlaid catalog
+            entry = (await self.get_entry(channel)).with_overlay(disabled)
+            return entry.shards.get(field), entry.version
+
+        entry = catalog_l1_cache.get(channel)
+        if entry is not None and catalog_l1_cache.is_fresh(entry):
+            catalog_l1_cache.record_hit(channel)
+            self._refresh_if_stale(entry)
+            return entry.shards.get(field), entry.version
 
-        # 1. Check cache first
         try:
-            if cached_data := await self.redis.get(cache_key):
-                logger.info(f"Using cached catalog for channel '{channel}'.")
-                return json.loads(cached_data)
+            client = self.blob_redis or self.redis
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.hget(f"{channel}_catalog_shards", field)
+                pipe.hmget(f"{channel}_catalog_meta", "version", "shards_version")
+                shard, (version, shards_version) = await pipe.execute()
+            # Workers predating shards refresh the meta without rewriting them
+            if version is not None and version == shards_version:
+                if isinstance(version, bytes):
+                    version = version.decode("utf-8")
+                if isinstance(shard, str):
+                    shard = shard.encode("utf-8")
+                # None here is an unknown category: no need to load the full catalog to say so
+                return shard, version
+        except Exception as e:
+            logger.error(f"Shard read error for channel '{channel}': {e}", exc_info=True)
+
+        # No current shards: fall back to the full catalog
+        entry = await self.get_entry(channel)
+        return entry.shards.get(field), entry.version
+
+    async def get_entry(self, channel: str) -> CatalogEntry:
+        """
+        Returns the catalog for a channel without waiting on Rista whenever any
+        copy exists. Copies past the soft TTL are served as-is while a
+        background refresh replaces them.
+        """
+        meta_key = f"{channel}_catalog_meta"
+
+        # 0. In-process copy, revalidated against the Redis version once its TTL passes
+        entry = catalog_l1_cache.get(channel)
+        if entry is not None and catalog_l1_cache.is_fresh(entry):
+            catalog_l1_cache.record_hit(channel)
+            self._refresh_if_stale(entry)
+            return entry
+
+        # 1. Check cache first (workers without Redis, e.g. the KDS outbox, skip it)
+        try:
+            if entry is not None and self.redis is not None:
+                version, fetched_at = await self.redis.hmget(meta_key, "version", "fetched_at")
+                if version == entry.version:
+                    entry.fetched_at = float(fetched_at or entry.fetched_at)
+                    catalog_l1_cache.touch(entry)
+                    catalog_l1_cache.record_hit(channel)
+                    self._refresh_if_stale(entry)
+                    return entry
+
+            if self.redis is not None and (cached := await self._read_cached(channel)) is not None:
+                self._refresh_if_stale(cached)
+                return cached
         except Exception as e:
             logger.error(f"Cache read error for channel '{channel}': {e}", exc_info=True)
 
-        # 2. If not in cache, fetch from Rista
-        logger.info(f"Cache miss. Fetching fresh catalog for channel '{channel}' from Rista...")
+        # 2. Nothing shared (no Redis, or it failed): keep serving the in-process copy until the soft TTL
+        if entry is not None:
+            catalog_l1_cache.touch(entry)
+            self._refresh_if_stale(entry)
+            return entry
+
+        # 3. Cold worker: latest durable snapshot, else Rista (one load per channel per worker)
+        # Shield so a disconnecting kiosk does not cancel the load other requests are waiting on
+        return await asyncio.shield(self._single_flight(f"cold:{channel}", lambda: self._load_cold(channel)))
+
+    async def _load_cold(self, channel: str) -> CatalogEntry:
+        self._spawn(self._count(channel, "misses"))
+        if await self._was_invalidated(channel):
+            # Cleared on purpose: the snapshot is the copy being replaced, so only a last resort
+            try:
+                return await self._start_refresh(channel)
+            except HTTPException:
+                snapshot = await self._load_snapshot(channel)
+                if snapshot is None:
+                    raise
+                return snapshot
+        if (snapshot := await self._load_snapshot(channel)) is not None:
+            self._refresh_in_background(snapshot)
+            return snapshot
+        return await self._start_refresh(channel)
+
+    async def _was_invalidated(self, channel: str) -> bool:
+        """Whether the channel's cache was cleared (DELETE /catalog/cache) and not refetched since."""
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(f"{channel}_catalog_invalidated"))
+        except Exception as e:
+            logger.warning(f"Invalidation marker read failed for channel '{channel}': {e}")
+            return False
+
+    def _start_refresh(self, channel: str, previous: CatalogEntry | None = None, background: bool = False) -> asyncio.Task:
+        return self._single_flight(
+            f"refresh:{channel}",
+            lambda: self._refresh_catalog(channel, previous=previous, background=background),
+            background=background,
+        )
+
+    @staticmethod
+    def _single_flight(key: str, factory, background: bool = False) -> asyncio.Task:
+        """Returns the in-flight task for `key`, starting one from `factory` if there is none."""
+        task = _inflight_refreshes.get(key)
+        if task is not None:
+            return task
+
+        task = asyncio.create_task(factory())
+        _inflight_refreshes[key] = task
+
+        def _forget(done: asyncio.Task) -> None:
+            if _inflight_refreshes.get(key) is done:
+                del _inflight_refreshes[key]
+            if not done.cancelled() and done.exception() is not None and background:
+                logger.warning(f"Background catalog task '{key}' failed: {done.exception()}")
+
+        task.add_done_callback(_forget)
+        return task
+
+    def _refresh_if_stale(self, entry: CatalogEntry) -> None:
+        """Schedules a background refresh once an entry is past the soft TTL."""
+        if time.time() - entry.fetched_at >= settings.CATALOG_SOFT_TTL_SECONDS:
+            self._refresh_in_background(entry)
+
+    def _refresh_in_background(self, entry: CatalogEntry) -> None:
+        now = time.monotonic()
+        if now - _last_background_attempt.get(entry.channel, 0.0) < settings.CATALOG_LOCK_WAIT_SECONDS:
+            return
+        _last_background_attempt[entry.channel] = now
+        self._start_refresh(entry.channel, previous=entry, background=True)
+
+    async def _read_cached(self, channel: str) -> CatalogEntry | None:
+        body, gzip_body, version, fetched_at = await self._read_blob(channel)
+        if body is None:
+            # Legacy plain-JSON key (written by workers predating the binary format)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(f"{channel}_catalog_data")
+                pipe.hmget(f"{channel}_catalog_meta", "version", "fetched_at")
+                cached_data, (version, fetched_at) = await pipe.execute()
+            if not cached_data:
+                return None
+            body = cached_data.encode("utf-8")
+
+        logger.info(f"Using cached catalog for channel '{channel}'.")
+        catalog_l1_cache.record_miss(channel)
+        if version is not None:
+            self._spawn(self._count(channel, "redis_hits"))
+        entry = CatalogEntry(
+            channel,
+            version or self._version_of(body),
+            json.loads(body),
+            fetched_at=float(fetched_at or 0.0),
+            body=body,
+        )
+        if gzip_body is not None:
+            entry.add_encoded("gzip", gzip_body)
+        catalog_l1_cache.put(entry)
+        return entry
+
+    async def _read_blob(self, channel: str) -> tuple[bytes | None, bytes | None, str | None, str | None]:
+        """
+        Reads the binary catalog entry. Returns (json_body, gzip_body, version, fetched_at),
+        with json_body None when there is no blob, it is in a format this worker cannot read,
+        or it is not the version in the meta hash.
+        """
+        if self.blob_redis is None:
+            return None, None, None, None
+
+        async with self.blob_redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"{channel}_catalog_blob")
+            pipe.hmget(f"{channel}_catalog_meta", "version", "fetched_at")
+            blob, (version, fetched_at) = await pipe.execute()
+        if not blob:
+            return None, None, None, None
+
+        try:
+            body = catalog_codec.decode(blob)
+        except Exception as e:
+            logger.error(f"Corrupt catalog blob for channel '{channel}': {e}")
+            body = None
+        if body is None:
+            return None, None, None, None
+
+        version = version.decode("utf-8") if version else None
+        if version is not None and self._version_of(body) != version:
+            # A worker predating the binary format refreshed only the legacy key and the meta
+            logger.info(f"Catalog blob for channel '{channel}' is not version {version}, using the legacy key.")
+            return None, None, None, None
+
+        # A gzip payload doubles as the ready-made gzip response body
+        gzip_body = blob[catalog_codec.HEADER_SIZE:] if blob[3] == catalog_codec.CODEC_GZIP else None
+        return body, gzip_body, version, fetched_at.decode("utf-8") if fetched_at else None
+
+    async def _refresh_catalog(
+            self, channel: str, previous: CatalogEntry | None = None, background: bool = False
+    ) -> CatalogEntry:
+        """
+        Fetches the catalog from Rista under a cross-worker Redis lock.
+        Workers that lose the lock wait briefly for the winner to fill Redis,
+        then fall back to their previous copy before fetching themselves.
+        Background refreshes simply step aside when another worker holds the lock.
+        """
+        if self.redis is None:
+            return await self._fetch_and_store(channel)
+
+        lock = self.redis.lock(
+            f"{channel}_catalog_lock",
+            timeout=settings.CATALOG_LOCK_TTL_SECONDS,
+            blocking=False,
+        )
+        try:
+            acquired = await lock.acquire()
+        except Exception as e:
+            logger.warning(f"Catalog lock unavailable for channel '{channel}': {e}")
+            acquired = False
+            lock = None
+
+        if not acquired and lock is not None:
+            if background and previous is not None:
+                return previous
+
+            logger.info(f"Catalog for channel '{channel}' is being refreshed by another worker, waiting...")
+            deadline = time.monotonic() + settings.CATALOG_LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+                try:
+                    if (cached := await self._read_cached(channel)) is not None:
+                        return cached
+                except Exception as e:
+                    logger.error(f"Cache read error for channel '{channel}': {e}", exc_info=True)
+                    break
+
+            if previous is not None:
+                logger.warning(f"Serving previous catalog version {previous.version} for channel '{channel}'.")
+                return previous
+
+        try:
+            return await self._fetch_and_store(channel)
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    logger.warning(f"Catalog lock release failed for channel '{channel}': {e}")
+
+    async def _fetch_and_store(self, channel: str) -> CatalogEntry:
+        logger.info(f"Fetching fresh catalog for channel '{channel}' from Rista...")
+        started = time.perf_counter()
         try:
             catalog_data = await self.rista.fetch_catalog_raw(channel)
+        except CircuitOpenError:
+            # Callers holding a copy (L1, Redis, snapshot) keep serving it
+            logger.warning(f"Rista circuit open, catalog for channel '{channel}' not fetched.")
+            raise HTTPException(status_code=503, detail="Catalog service temporarily unavailable")
         except httpx.HTTPStatusError as e:
             logger.error(f"Rista API error for channel '{channel}': {e.response.status_code} - {e.response.text}")
             raise HTTPException(
@@ -38,154 +376,272 @@ class CatalogService:
             logger.error(f"Failed to fetch catalog from Rista for channel '{channel}': {e}", exc_info=True)
             raise HTTPException(status_code=503, detail="Catalog service temporarily unavailable")
 
-        # Inject static category images
-        CATEGORY_IMAGES = {
-            "6868ca5dc29c8ed4d3c98dd5": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032823/Idli_oh6wpb.jpg",
-            "68e778dd0c42e107fdf5cf3f": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767786181/360_F_786760607_IwcScz3k7Efj42i1S7mnewhWQXrhAa0o_dnjnqq.jpg",
-            "6868ca5dc29c8ed4d3c98dd4": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032824/Davanagere_Dose_rsju7o.jpg",
-            "6868ca5dc29c8ed4d3c98dd8": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032824/Coffee_f8hx0m.jpg",
-            "6868ca5dc29c8ed4d3c98dd3": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032828/Bengaluru_Dose_bdrozv.jpg",
-            "6868ca5dc29c8ed4d3c98dd7": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032825/Rice_j5hjnu.jpg",
-            "6868ca5dc29c8ed4d3c98dd6": "https://res.cloudinary.com/dr01mnmi7/image/upload/v1767032827/WadaSnacks_nkhdsn.jpg"
-        }
-
-        if catalog_data and "categories" in catalog_data:
-            # 1. Inject Images
-            for category in catalog_data["categories"]:
-                cat_id = category.get("categoryId")
-                if cat_id in CATEGORY_IMAGES:
-                    category["imageURL"] = CATEGORY_IMAGES[cat_id]
-
-            # 2. Sort Categories
-            CATEGORY_ORDER = [
-                "6868ca5dc29c8ed4d3c98dd3",  # Davanagere Dose
-                "6868ca5dc29c8ed4d3c98dd4",  # Bengaluru Dose
-                "6868ca5dc29c8ed4d3c98dd5",  # Idli
-                "6868ca5dc29c8ed4d3c98dd7",  # Rice
-                "6868ca5dc29c8ed4d3c98dd6",  # Wada/Snacks
-                "6868ca5dc29c8ed4d3c98dd8",  # Coffee
-                "68e778dd0c42e107fdf5cf3f",  # BEVERAGE
-            ]
-
-            def get_sort_index(cat):
-                cid = cat.get("categoryId")
-                try:
-                    return CATEGORY_ORDER.index(cid)
-                except ValueError:
-                    return 999  # Put unknown categories at the end
+        fetch_ms = round((time.perf_counter() - started) * 1000, 1)
+        self._prepare_catalog(catalog_data)
 
-            catalog_data["categories"].sort(key=get_sort_index)
+        # Store in cache. The hard TTL only bounds abandoned channels;
+        # freshness is governed by the soft TTL and the background refresher.
+        catalog_l1_cache.record_miss(channel)
+        serialized = json.dumps(catalog_data, separators=(",", ":"))
+        body = serialized.encode("utf-8")
+        entry = CatalogEntry(channel, self._version_of(body), catalog_data, body=body)
+        # Build (and validate) the per-SKU pricing and KDS line templates now, once per version
+        problems = dict(entry.index.problems)
+        if problems:
+            logger.warning(
+                f"Catalog {entry.version} for channel '{channel}' has {len(problems)} entries "
+                f"that cannot be ordered or posted to KDS: {problems}"
+            )
+        catalog_l1_cache.put(entry)
+        self._spawn(self._save_snapshot(entry))
 
-        # 3. Store in cache
+        if self.redis is None:
+            return entry
+
+        blob = None
+        if self.blob_redis is not None:
+            codec = catalog_codec.CODECS.get(settings.CATALOG_BLOB_CODEC, catalog_codec.CODEC_GZIP)
+            blob = await asyncio.to_thread(catalog_codec.encode, body, codec, settings.CATALOG_BLOB_LEVEL)
+            if blob[3] == catalog_codec.CODEC_GZIP:
+                entry.add_encoded("gzip", blob[catalog_codec.HEADER_SIZE:])
         try:
-            await self.redis.set(cache_key, json.dumps(catalog_data), ex=3600)
+            # Blob first, then meta: readers that see the new version can always load it
+            if blob is not None:
+                await self.blob_redis.set(f"{channel}_catalog_blob", blob, ex=settings.CATALOG_HARD_TTL_SECONDS)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if blob is None or settings.CATALOG_WRITE_LEGACY_JSON:
+                    pipe.set(f"{channel}_catalog_data", serialized, ex=settings.CATALOG_HARD_TTL_SECONDS)
+                pipe.hset(f"{channel}_catalog_meta", mapping={
+                    "version": entry.version,
+                    "shards_version": entry.version,
+                    "fetched_at": entry.fetched_at,
+                    "size_bytes": len(body),
+                    "stored_bytes": len(blob) if blob is not None else len(body),
+                    "last_fetch_ms": fetch_ms,
+                    "invalid_entries": json.dumps(problems),
+                })
+                pipe.hincrby(f"{channel}_catalog_meta", "refreshes", 1)
+                pipe.expire(f"{channel}_catalog_meta", settings.CATALOG_HARD_TTL_SECONDS)
+                pipe.sadd(CATALOG_CHANNELS_KEY, channel)
+                pipe.delete(f"{channel}_catalog_invalidated")
+                pipe.delete(f"{channel}_catalog_shards")
+                pipe.hset(f"{channel}_catalog_shards", mapping=entry.shards)
+                pipe.expire(f"{channel}_catalog_shards", settings.CATALOG_HARD_TTL_SECONDS)
+                await pipe.execute()
             logger.info(f"Successfully cached catalog for channel '{channel}'.")
         except Exception as e:
             logger.warning(f"Cache write error for channel '{channel}': {e}", exc_info=True)
+        else:
+            await publish_catalog_event(self.redis, channel, "refresh", entry.version)
 
-        return catalog_data
+        return entry
 
-    # --- KDS Helper Methods ---
+    @staticmethod
+    def _prepare_catalog(catalog_data: Dict[str, Any]) -> None:
+        """Injects category images and applies CATEGORY_ORDER. Runs once per refresh."""
+        if not catalog_data or "categories" not in catalog_data:
+            return
 
-    def money(self, x: float) -> float:
-        from decimal import Decimal, ROUND_HALF_UP
-        return float(Decimal(str(x)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+        # 1. Inject Images
+        for category in catalog_data["categories"]:
+            cat_id = category.get("categoryId")
+            if cat_id in CATEGORY_IMAGES:
+                category["imageURL"] = CATEGORY_IMAGES[cat_id]
 
-    def find_item(self, catalog_items: list, sku: str | None = None) -> Dict | None:
-        for it in catalog_items:
-            if it.get("status") != "Active":
-                continue
-            if sku is not None and str(it.get("skuCode")) == str(sku):
-                return it
-        return None
+        # 2. Sort Categories, unknown categories at the end
+        catalog_data["categories"].sort(key=lambda cat: _CATEGORY_RANK.get(cat.get("categoryId"), 999))
 
-    def calculate_tax_amounts(self, sale_amount: float, tax_percentage: float, price_includes_tax: bool) -> tuple[float, float]:
-        if price_includes_tax:
-            tax_amount = (sale_amount * tax_percentage) / (100 + tax_percentage)
-            return self.money(tax_amount), 0.0
-        else:
-            tax_amount = (sale_amount * tax_percentage) / 100
-            return 0.0, self.money(tax_amount)
-
-    def build_sale_item(self, src_item: Dict, qty: int, tax_index: Dict) -> tuple[Dict, float, float]:
-        qty = int(qty)
-        unit_price = float(src_item["price"])
-        item_amount = unit_price * qty
-
-        taxes = []
-        total_tax_included = 0.0
-        total_tax_excluded = 0.0
-        price_includes_tax = bool(src_item.get("isPriceIncludesTax", False))
-
-        for tax_id in src_item.get("taxTypeIds", []):
-            meta = tax_index.get(tax_id)
-            if not meta:
-                continue
-
-            rate = float(meta["percentage"])
-            amount_included, amount_excluded = self.calculate_tax_amounts(
-                item_amount, rate, price_includes_tax
+    # --- Durable Snapshots ---
+
+    async def _load_snapshot(self, channel: str) -> CatalogEntry | None:
+        """Latest catalog snapshot for a channel from the menus table, if any."""
+        try:
+            async with SessionLocal() as db:
+                stmt = (
+                    select(Menu)
+                    .where(Menu.channel == channel)
+                    .order_by(Menu.updated_at.desc())
+                    .limit(1)
+                )
+                menu = (await db.execute(stmt)).scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Snapshot read error for channel '{channel}': {e}", exc_info=True)
+            return None
+
+        if menu is None:
+            return None
+
+        logger.warning(f"Serving catalog snapshot {menu.content_hash} for channel '{channel}'.")
+        catalog_l1_cache.record_miss(channel)
+        entry = CatalogEntry(channel, menu.content_hash, menu.data, fetched_at=menu.updated_at.timestamp())
+        catalog_l1_cache.put(entry)
+        return entry
+
+    @staticmethod
+    async def _save_snapshot(entry: CatalogEntry) -> None:
+        """Persists a fetched catalog; identical content only bumps updated_at."""
+        try:
+            async with SessionLocal() as db:
+                stmt = pg_insert(Menu).values(
+                    provider="rista",
+                    channel=entry.channel,
+                    content_hash=entry.version,
+                    data=entry.data,
+                ).on_conflict_do_update(
+                    constraint="uq_menus_channel_hash",
+                    set_={"updated_at": func.now()},
+                )
+                await db.execute(stmt)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Snapshot write error for channel '{entry.channel}': {e}", exc_info=True)
+
+    @staticmethod
+    def _spawn(coro) -> None:
+        task = asyncio.create_task(coro)
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def clear_cache(self, channel: str) -> bool:
+        """
+        Drops the shared and in-process copies of a channel's catalog. Cold
+        workers then go to Rista before the Postgres snapshot until a fetch succeeds.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(
+                f"{channel}_catalog_data",
+                f"{channel}_catalog_blob",
+                f"{channel}_catalog_meta",
+                f"{channel}_catalog_shards",
             )
+            pipe.srem(CATALOG_CHANNELS_KEY, channel)
+            pipe.set(f"{channel}_catalog_invalidated", "1", ex=settings.CATALOG_HARD_TTL_SECONDS)
+            deleted, _, _ = await pipe.execute()
+        catalog_l1_cache.invalidate(channel)
+        await publish_catalog_event(self.redis, channel, "invalidate")
+        return deleted > 0
+
+    # --- Availability Overlay ---
+
+    async def get_disabled_skus(self, channel: str) -> FrozenSet[str]:
+        """
+        SKUs currently marked out of stock for a channel. Cached per worker for
+        the L1 TTL; availability events drop the cached set immediately.
+        """
+        cached = availability_overlay.get(channel)
+        if cached is not None:
+            return cached
+        if self.redis is None:
+            return availability_overlay.get(channel, allow_stale=True) or frozenset()
+        try:
+            skus = await self.redis.smembers(f"{channel}_catalog_disabled_skus")
+        except Exception as e:
+            logger.error(f"Availability read error for channel '{channel}': {e}", exc_info=True)
+            return availability_overlay.get(channel, allow_stale=True) or frozenset()
+        return availability_overlay.put(channel, skus)
+
+    async def set_availability(self, channel: str, sku_codes: Iterable[str], available: bool) -> FrozenSet[str]:
+        """
+        Marks SKUs in or out of stock without touching the cached catalog, and
+        tells every worker to re-read the disabled set. Returns the new set.
+        """
+        key = f"{channel}_catalog_disabled_skus"
+        sku_codes = [str(sku) for sku in sku_codes]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if sku_codes:
+                if available:
+                    pipe.srem(key, *sku_codes)
+                else:
+                    pipe.sadd(key, *sku_codes)
+            pipe.smembers(key)
+            results = await pipe.execute()
+        skus = availability_overlay.put(channel, results[-1])
+        await publish_catalog_event(self.redis, channel, "availability")
+        return skus
+
+    # --- Cache Metrics ---
+
+    async def _count(self, channel: str, field: str) -> None:
+        if self.redis is None:
+            return
+        key = f"{channel}_catalog_meta"
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, field, 1)
+                pipe.ttl(key)
+                _, ttl = await pipe.execute()
+            # Counting a channel that is not cached (unknown, or just cleared) creates the hash: never leave it without a TTL
+            if ttl == -1:
+                await self.redis.expire(key, settings.CATALOG_HARD_TTL_SECONDS)
+        except Exception as e:
+            logger.debug(f"Cache counter update failed for channel '{channel}': {e}")
 
-            total_tax_included += amount_included
-            total_tax_excluded += amount_excluded
+    async def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Per-channel cache metadata from the channel registry. Never scans the
+        keyspace: one SMEMBERS plus one pipelined HGETALL/PTTL per channel.
+        """
+        channels = sorted(await self.redis.smembers(CATALOG_CHANNELS_KEY))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.hgetall(f"{channel}_catalog_meta")
+                pipe.pttl(f"{channel}_catalog_data")
+                pipe.pttl(f"{channel}_catalog_blob")
+            results = await pipe.execute()
 
-            taxes.append({
-                "name": meta["name"],
-                "percentage": rate,
-                "saleAmount": self.money(item_amount),
-                "amountIncluded": amount_included,
-                "amountExcluded": amount_excluded,
-                "amount": self.money(amount_included + amount_excluded),
+        now = time.time()
+        stats = []
+        for channel, meta, legacy_pttl, blob_pttl in zip(channels, results[0::3], results[1::3], results[2::3]):
+            pttl = max(legacy_pttl, blob_pttl)
+            fetched_at = float(meta.get("fetched_at", 0.0))
+            age = now - fetched_at if fetched_at else None
+            stats.append({
+                "channel": channel,
+                "cached": pttl != -2,
+                "version": meta.get("version"),
+                "size_bytes": int(meta.get("size_bytes", 0)),
+                "stored_bytes": int(meta.get("stored_bytes", meta.get("size_bytes", 0))),
+                "fetched_at": datetime.fromtimestamp(fetched_at, timezone.utc).isoformat() if fetched_at else None,
+                "age_seconds": round(age, 1) if age is not None else None,
+                "soft_ttl_remaining_seconds": round(max(settings.CATALOG_SOFT_TTL_SECONDS - age, 0.0), 1) if age is not None else None,
+                "hard_ttl_remaining_seconds": round(pttl / 1000, 1) if pttl > 0 else None,
+                "refreshes": int(meta.get("refreshes", 0)),
+                "redis_hits": int(meta.get("redis_hits", 0)),
+                "misses": int(meta.get("misses", 0)),
+                "last_fetch_ms": float(meta["last_fetch_ms"]) if "last_fetch_ms" in meta else None,
+                "invalid_entries": json.loads(meta.get("invalid_entries") or "{}"),
+                "worker": catalog_l1_cache.channel_stats(channel),
             })
+        return {"channels": stats, "worker": catalog_l1_cache.stats()}
 
-        item_total_amount = self.money(item_amount)
-        line = {
-            "shortName": src_item["itemName"],
-            "skuCode": src_item["skuCode"],
-            "quantity": qty,
-            "unitPrice": self.money(unit_price),
-            "itemAmount": item_total_amount,
-            "itemNature": "Service",
-            "itemTotalAmount": item_total_amount,
-        }
-
-        if taxes:
-            if total_tax_included: line["taxAmountIncluded"] = self.money(total_tax_included)
-            if total_tax_excluded: line["taxAmountExcluded"] = self.money(total_tax_excluded)
-            line["taxes"] = taxes
-
-        return line, total_tax_included, total_tax_excluded
-
-    def summarize_taxes(self, items: list) -> list:
-        agg = {}
-        for it in items:
-            for t in it.get("taxes", []):
-                key = (t["name"], t["percentage"])
-                entry = agg.setdefault(key, {
-                    "name": t["name"],
-                    "percentage": t["percentage"],
-                    "saleAmount": 0.0,
-                    "itemTaxIncluded": 0.0,
-                    "itemTaxExcluded": 0.0,
-                    "chargeTaxIncluded": 0.0,
-                    "chargeTaxExcluded": 0.0,
-                    "amountIncluded": 0.0,
-                    "amountExcluded": 0.0,
-                    "amount": 0.0,
-                })
-                entry["saleAmount"] += float(t.get("saleAmount", 0.0))
-                inc = float(t.get("amountIncluded", 0.0))
-                exc = float(t.get("amountExcluded", 0.0))
-                entry["itemTaxIncluded"] += inc
-                entry["itemTaxExcluded"] += exc
-                entry["amountIncluded"] += inc
-                entry["amountExcluded"] += exc
-                entry["amount"] += float(t.get("amount", 0.0))
-
-        for v in agg.values():
-            for k in ["saleAmount", "itemTaxIncluded", "itemTaxExcluded",
-                      "chargeTaxIncluded", "chargeTaxExcluded",
-                      "amountIncluded", "amountExcluded", "amount"]:
-                v[k] = self.money(v[k])
-        return list(agg.values())
+    @staticmethod
+    def _version_of(serialized: bytes) -> str:
+        """Content hash of a serialized catalog, used to revalidate in-process copies."""
+        return hashlib.sha256(serialized).hexdigest()[:16]
+
+    # --- Background Refresher ---
+
+    @staticmethod
+    async def run_refresher(
+            redis_client: redis.Redis,
+            rista_client: RistaClient,
+            channels: Iterable[str],
+            blob_redis_client: redis.Redis | None = None,
+    ):
+        """
+        Periodically refreshes catalogs past the soft TTL so kiosk requests never
+        wait on Rista. Runs in every worker; the Redis lock and the shared
+        fetched_at timestamp keep it to one Rista fetch per channel.
+        """
+        service = CatalogService(redis_client, rista_client, blob_redis_client)
+        configured = set(channels)
+        while True:
+            await asyncio.sleep(settings.CATALOG_REFRESH_INTERVAL_SECONDS)
+            for channel in configured | set(catalog_l1_cache.channels()):
+                try:
+                    fetched_at = await redis_client.hget(f"{channel}_catalog_meta", "fetched_at")
+                    if fetched_at and time.time() - float(fetched_at) < settings.CATALOG_SOFT_TTL_SECONDS:
+                        continue
+                    await service._start_refresh(channel, previous=catalog_l1_cache.get(channel), background=True)
+                except Exception as e:
+                    logger.warning(f"Scheduled catalog refresh failed for channel '{channel}': {e}")
@@ -0,0 +1,141 @@
+"""
+Idempotency-Key support for non-idempotent POSTs (order creation, payment initiation).
+
+The first request with a key claims it with SET NX (a short-lived "pending"
+marker), runs, and stores its response for IDEMPOTENCY_TTL_SECONDS. Replays
+get the stored response; duplicates arriving while the first is still running
+wait for it. Only client errors (validation, not found) are stored with it;
+server, rate-limit and payment gateway errors release the key so the client
+can retry.
+"""
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+# Headroom on top of the handler timeouts before a pending claim may expire
+PENDING_TTL_MARGIN_SECONDS = 15
+
+
+class UpstreamHTTPException(HTTPException):
+    """An error status passed on from an upstream API (payment gateway); never replayed."""
+
+
+def pending_ttl_seconds() -> int:
+    """
+    Lifetime of a pending claim. It must outlive the slowest handler, a cold
+    catalog refresh followed by a payment gateway call, or a duplicate could
+    take the key over while the first request is still running.
+    """
+    slowest = settings.CATALOG_LOCK_TTL_SECONDS + settings.PAYMENT_INIT_TIMEOUT_SECONDS
+    return max(settings.IDEMPOTENCY_PENDING_TTL_SECONDS, math.ceil(slowest) + PENDING_TTL_MARGIN_SECONDS)
+
+
+def _is_final(e: HTTPException) -> bool:
+    """Client-caused errors are stored and replayed; anything a retry could fix releases the key."""
+    if isinstance(e, UpstreamHTTPException):
+        return False
+    return e.status_code < 500 and e.status_code not in (408, 429)
+
+
+class Idempotency:
+    def __init__(self, redis_client: Optional[redis.Redis], key: Optional[str]):
+        self.redis = redis_client
+        self.key = key.strip() if key else None
+
+    async def run(self, scope: str, payload: Any, handler: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `handler` at most once per (scope, Idempotency-Key). Without a key,
+        or without Redis, it simply runs the handler.
+        """
+        if not self.key or self.redis is None:
+            return await handler()
+        if len(self.key) > 255:
+            raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_KEY_HEADER} is too long")
+
+        redis_key = f"idempotency:{scope}:{self.key}"
+        fingerprint = hashlib.sha256(
+            json.dumps(jsonable_encoder(payload), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            try:
+                claimed = await self.redis.set(
+                    redis_key,
+                    json.dumps({"state": "pending", "fingerprint": fingerprint}),
+                    nx=True,
+                    ex=pending_ttl_seconds(),
+                )
+                replay = None if claimed else await self._wait_for_first(redis_key, fingerprint, deadline)
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.warning(f"Idempotency store unavailable, processing '{scope}' without it: {e}")
+                return await handler()
+            if claimed:
+                break
+            if replay is not None:
+                return replay
+            # The first attempt failed and released the key: take it over
+
+        try:
+            result = await handler()
+        except HTTPException as e:
+            if _is_final(e):
+                await self._store(redis_key, fingerprint, e.status_code, {"detail": e.detail})
+            else:
+                await self._release(redis_key)
+            raise
+        except BaseException:
+            await self._release(redis_key)
+            raise
+
+        await self._store(redis_key, fingerprint, 200, jsonable_encoder(result, by_alias=True))
+        return result
+
+    async def _wait_for_first(self, redis_key: str, fingerprint: str, deadline: float) -> Optional[JSONResponse]:
+        """The stored response once the first request finishes, or None if it released the key."""
+        while True:
+            raw = await self.redis.get(redis_key)
+            if raw is None:
+                return None
+            record = json.loads(raw)
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body.")
+            if record["state"] == "done":
+                return JSONResponse(
+                    status_code=record["status_code"],
+                    content=record["body"],
+                    headers={"Idempotent-Replayed": "true"},
+                )
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress.")
+            await asyncio.sleep(0.1)
+
+    async def _store(self, redis_key: str, fingerprint: str, status_code: int, body: Any) -> None:
+        record = {"state": "done", "fingerprint": fingerprint, "status_code": status_code, "body": body}
+        try:
+            await self.redis.set(redis_key, json.dumps(record), ex=settings.IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not store idempotent response for {redis_key}: {e}")
+
+    async def _release(self, redis_key: str) -> None:
+        try:
+            await self.redis.delete(redis_key)
+        except Exception as e:
+            logger.warning(f"Could not release idempotency key {redis_key}: {e}")
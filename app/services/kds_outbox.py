@@ -0,0 +1,200 @@
+"""
+Transactional outbox for Rista KDS posts.
+
+Payment paths call enqueue() in the transaction that marks an order
+COMPLETED and return as soon as it commits. run_kds_outbox() runs in every
+worker process: it claims due rows with FOR UPDATE SKIP LOCKED (so workers
+never take the same row), leasing each for KDS_OUTBOX_LEASE_SECONDS, and
+posts up to KDS_OUTBOX_CONCURRENCY of them at a time. A failed post is
+retried with exponential backoff; a worker that dies mid-post leaves the row
+to be picked up again when its lease runs out. While Rista's circuit breaker
+is open nothing is claimed, and a post it stops is deferred without counting
+as an attempt.
+"""
+import time
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import timedelta
+from typing import List, Set
+
+import redis.asyncio as redis
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core import metrics
+from app.db.models.kds_outbox import KdsOutbox
+from app.db.models.order import Order
+from app.db.session import SessionLocal
+from app.services.catalog_service import CatalogService
+from app.services.order_service import OrderService
+from app.utils.rista import RistaClient
+from app.utils.circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+DEPTH_REFRESH_SECONDS = 5.0
+
+outbox_depth = metrics.gauge("kiosk_kds_outbox_depth", "Orders waiting in the KDS outbox (all workers).")
+outbox_oldest_age = metrics.gauge("kiosk_kds_outbox_oldest_age_seconds", "Age of the oldest KDS outbox row.")
+outbox_inflight = metrics.gauge("kiosk_kds_outbox_inflight", "KDS posts in progress in this worker.")
+
+# Set after a local enqueue commits so this worker's dispatcher need not wait for its next poll
+_wakeup = asyncio.Event()
+
+
+async def enqueue(db: AsyncSession, order_id: str) -> None:
+    """Queues a KDS post for the order in the caller's transaction; a no-op if one is already queued."""
+    stmt = insert(KdsOutbox).values(order_id=order_id).on_conflict_do_nothing(index_elements=["order_id"])
+    await db.execute(stmt)
+
+
+def notify() -> None:
+    """Wakes this process's dispatcher; call after committing an enqueue."""
+    _wakeup.set()
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(
+        settings.KDS_OUTBOX_BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+        settings.KDS_OUTBOX_BACKOFF_MAX_SECONDS,
+    )
+
+
+async def claim(db: AsyncSession, limit: int) -> List[Row]:
+    """Leases up to `limit` due rows to this worker. Commit to release the row locks."""
+    due = (
+        select(KdsOutbox.id)
+        .where(KdsOutbox.next_attempt_at <= func.now())
+        .order_by(KdsOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(KdsOutbox)
+        .where(KdsOutbox.id.in_(due.scalar_subquery()))
+        .values(
+            attempts=KdsOutbox.attempts + 1,
+            next_attempt_at=func.now() + timedelta(seconds=settings.KDS_OUTBOX_LEASE_SECONDS),
+        )
+        .returning(KdsOutbox.id, KdsOutbox.order_id, KdsOutbox.attempts)
+        .execution_options(synchronize_session=False)
+    )
+    return list(await db.execute(stmt))
+
+
+async def deliver(db: AsyncSession, order_service: OrderService, job: Row) -> bool:
+    """Posts one claimed order to Rista, then removes or reschedules its outbox row."""
+    order = (await db.execute(select(Order).where(Order.order_id == job.order_id))).scalar_one_or_none()
+    if order is None:
+        logger.warning(f"KDS outbox: order {job.order_id} no longer exists, dropping")
+        posted, error = True, None
+    else:
+        try:
+            posted, _ = await order_service.sync_order_to_kds(order)
+            error = None if posted else order.kds_last_error
+        except CircuitOpenError:
+            await db.rollback()
+            logger.info(f"KDS outbox: Rista circuit open, deferring {job.order_id}")
+            await db.execute(
+                update(KdsOutbox)
+                .where(KdsOutbox.id == job.id)
+                .values(
+                    attempts=KdsOutbox.attempts - 1,
+                    next_attempt_at=func.now() + timedelta(seconds=settings.RISTA_CIRCUIT_OPEN_SECONDS),
+                )
+            )
+            await db.commit()
+            return False
+        except Exception as e:
+            await db.rollback()
+            posted, error = False, str(e)
+
+    if posted or job.attempts >= settings.KDS_OUTBOX_MAX_ATTEMPTS:
+        if not posted:
+            logger.error(f"KDS outbox: {job.order_id} still failing after attempt {job.attempts}, left to the sweeper: {error}")
+        await db.execute(delete(KdsOutbox).where(KdsOutbox.id == job.id))
+    else:
+        delay = backoff_seconds(job.attempts)
+        logger.warning(f"KDS outbox: attempt {job.attempts} for {job.order_id} failed, retrying in {delay:.1f}s")
+        await db.execute(
+            update(KdsOutbox)
+            .where(KdsOutbox.id == job.id)
+            .values(next_attempt_at=func.now() + timedelta(seconds=delay), last_error=error)
+        )
+    await db.commit()
+    return posted
+
+
+async def record_depth(db: AsyncSession) -> None:
+    stmt = select(func.count(), func.extract("epoch", func.now() - func.min(KdsOutbox.created_at)))
+    count, oldest_age = (await db.execute(stmt)).one()
+    outbox_depth.set(count)
+    outbox_oldest_age.set(float(oldest_age or 0))
+
+
+async def run_kds_outbox(
+        redis_client: redis.Redis | None,
+        rista_client: RistaClient,
+        blob_redis_client: redis.Redis | None = None,
+) -> None:
+    """
+    Drains the outbox for the lifetime of the worker. Redis is optional: without
+    it the catalog comes from this worker's copy, the snapshot or Rista.
+    """
+    concurrency = settings.KDS_OUTBOX_CONCURRENCY
+    catalog_service = CatalogService(redis_client, rista_client, blob_redis_client)
+    inflight: Set[asyncio.Task] = set()
+    depth_checked = 0.0
+
+    async def process(job: Row) -> None:
+        async with SessionLocal() as db:
+            await deliver(db, OrderService(db, catalog_service, rista_client), job)
+
+    def finished(task: asyncio.Task) -> None:
+        inflight.discard(task)
+        outbox_inflight.set(len(inflight))
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"KDS outbox job failed: {task.exception()}")
+
+    try:
+        while True:
+            try:
+                if len(inflight) >= concurrency:
+                    await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                _wakeup.clear()
+                if not await rista_client.available():
+                    # Rows stay due and are claimed once the circuit half-opens
+                    await asyncio.sleep(settings.KDS_OUTBOX_POLL_SECONDS)
+                    continue
+
+                async with SessionLocal() as db:
+                    jobs = await claim(db, concurrency - len(inflight))
+                    await db.commit()
+                    if time.monotonic() - depth_checked >= DEPTH_REFRESH_SECONDS:
+                        await record_depth(db)
+                        depth_checked = time.monotonic()
+
+                for job in jobs:
+                    task = asyncio.create_task(process(job))
+                    inflight.add(task)
+                    task.add_done_callback(finished)
+                outbox_inflight.set(len(inflight))
+
+                if not jobs:
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(_wakeup.wait(), settings.KDS_OUTBOX_POLL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"KDS outbox dispatcher error: {e}")
+                await asyncio.sleep(settings.KDS_OUTBOX_POLL_SECONDS)
+    finally:
+        # Leased rows of cancelled posts are retried once the lease expires
+        for task in inflight:
+            task.cancel()
@@ -0,0 +1,114 @@
+"""
+Reconciliation sweeper for paid orders that never reached Rista KDS.
+
+Every KDS_SWEEP_INTERVAL_SECONDS one worker (a Redis lock picks it; without
+Redis every worker sweeps) looks up COMPLETED orders whose KDS status is
+FAILED, or PENDING/NOT_POSTED with nothing queued for too long, through
+idx_orders_kds_sync, and puts them back in the KDS outbox, which does the
+posting with its usual bounded concurrency.
+
+Each re-queued order gets a single outbox attempt. Retry spacing is driven by
+kds_last_attempt_at: a FAILED order is due again once it has waited as long
+as it has already been failing (last attempt - created_at), clamped to
+KDS_SWEEP_MIN/MAX_BACKOFF_SECONDS, so the gap doubles with every failure.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import List
+
+import redis.asyncio as redis
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core import metrics
+from app.db.models.kds_outbox import KdsOutbox
+from app.db.models.order import Order, PaymentStatus, KdsStatus
+from app.db.session import SessionLocal
+from app.services import kds_outbox
+
+logger = logging.getLogger(__name__)
+
+SWEEP_LOCK_KEY = "kds_sweeper_lock"
+
+sweep_requeued = metrics.gauge("kiosk_kds_sweep_requeued", "Orders re-queued for KDS by the last sweep.")
+
+
+async def find_due(db: AsyncSession, limit: int) -> List[str]:
+    """Order ids of paid orders whose KDS post should be retried now, oldest attempt first."""
+    last_attempt = func.coalesce(Order.kds_last_attempt_at, Order.updated_at, Order.created_at)
+    backoff = func.least(
+        func.greatest(last_attempt - Order.created_at, timedelta(seconds=settings.KDS_SWEEP_MIN_BACKOFF_SECONDS)),
+        timedelta(seconds=settings.KDS_SWEEP_MAX_BACKOFF_SECONDS),
+    )
+    stale = timedelta(seconds=settings.KDS_SWEEP_STALE_SECONDS)
+    queued = exists().where(KdsOutbox.order_id == Order.order_id)
+
+    stmt = (
+        select(Order.order_id)
+        .where(
+            Order.payment_status == PaymentStatus.COMPLETED,
+            Order.kds_status.in_([KdsStatus.FAILED, KdsStatus.PENDING, KdsStatus.NOT_POSTED]),
+            or_(
+                and_(Order.kds_status == KdsStatus.FAILED, last_attempt < func.now() - backoff),
+                and_(Order.kds_status != KdsStatus.FAILED, last_attempt < func.now() - stale),
+            ),
+            ~queued,
+        )
+        .order_by(last_attempt)
+        .limit(limit)
+    )
+    return list((await db.execute(stmt)).scalars())
+
+
+async def sweep(db: AsyncSession) -> int:
+    """Re-queues due orders for one outbox attempt each; returns how many were queued."""
+    order_ids = await find_due(db, settings.KDS_SWEEP_BATCH_SIZE)
+    if not order_ids:
+        return 0
+    # The next failure hands the order back to the sweeper's backoff rather than the outbox's
+    single_attempt = max(settings.KDS_OUTBOX_MAX_ATTEMPTS - 1, 0)
+    stmt = (
+        insert(KdsOutbox)
+        .values([{"order_id": order_id, "attempts": single_attempt} for order_id in order_ids])
+        .on_conflict_do_nothing(index_elements=["order_id"])
+    )
+    await db.execute(stmt)
+    await db.commit()
+    kds_outbox.notify()
+    return len(order_ids)
+
+
+async def _take_lock(redis_client: redis.Redis | None, interval: int) -> bool:
+    """
+    Whether this worker sweeps this interval. Without Redis every worker
+    sweeps: concurrent sweeps are harmless, since an order can be queued only once.
+    """
+    if redis_client is None:
+        return True
+    try:
+        return bool(await redis_client.set(SWEEP_LOCK_KEY, "1", nx=True, ex=interval))
+    except Exception as e:
+        logger.warning(f"KDS sweeper lock unavailable, sweeping without it: {e}")
+        return True
+
+
+async def run_kds_sweeper(redis_client: redis.Redis | None) -> None:
+    """Sweeps for the lifetime of the worker; the Redis lock keeps it to one sweep per interval."""
+    interval = settings.KDS_SWEEP_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await _take_lock(redis_client, interval):
+                continue
+            async with SessionLocal() as db:
+                requeued = await sweep(db)
+            sweep_requeued.set(requeued)
+            if requeued:
+                logger.info(f"KDS sweeper re-queued {requeued} orders")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"KDS sweep failed: {e}")
@@ -0,0 +1,138 @@
+"""
+Per-day Postgres sequences for KOT numbers.
+
+nextval() never blocks and is not transactional, so concurrent order creation
+no longer queues behind a single counter row lock held until commit. A rolled
+back order leaves a gap in that day's numbering; uniqueness is still enforced
+by uq_orders_kot_per_day.
+
+While KOT_SYNC_LEGACY_COUNTER is on (off by default; only for a rolling deploy
+from the counter-row allocator), numbers are drawn under the kot_counters row lock, in a short
+transaction of their own, and the row is moved past them. If old workers have
+taken numbers ahead of the sequence, it jumps past them first, so the two
+allocators never hand out the same number.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import List
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core.config import settings
+from app.db.session import engine
+from app.db.models.kot_counter import KotCounter
+from app.db.models.order import Order
+
+logger = logging.getLogger(__name__)
+
+KOT_SEQUENCE_PREFIX = "kot_seq_"
+# Older days' sequences are dropped when a new day's sequence is created
+KOT_SEQUENCE_RETENTION_DAYS = 7
+
+# Days whose sequence this worker has already seen, so the DDL check runs once per day
+_ensured_days: set[date] = set()
+_ensure_lock = asyncio.Lock()
+
+
+def sequence_name(kot_date: date) -> str:
+    return f"{KOT_SEQUENCE_PREFIX}{kot_date:%Y%m%d}"
+
+
+async def next_kot_numbers(session: AsyncSession, kot_date: date, count: int = 1) -> List[int]:
+    """Reserves `count` KOT numbers for a day, in ascending order."""
+    await _ensure_sequence(kot_date)
+    if settings.KOT_SYNC_LEGACY_COUNTER:
+        return sorted(await _draw_with_legacy_counter(kot_date, count))
+    return sorted(await _draw(session, kot_date, count))
+
+
+async def _draw(conn: AsyncSession | AsyncConnection, kot_date: date, count: int) -> List[int]:
+    result = await conn.execute(
+        text(f"SELECT nextval('{sequence_name(kot_date)}') FROM generate_series(1, :count)"),
+        {"count": count},
+    )
+    return [int(number) for number in result.scalars()]
+
+
+async def _draw_with_legacy_counter(kot_date: date, count: int) -> List[int]:
+    """
+    Draws under the counter row lock and moves the row past the numbers drawn.
+    Its own short transaction, so the lock is not held for the rest of the
+    order transaction.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(
+            insert(KotCounter)
+            .values(kot_date=kot_date, last_number=0)
+            .on_conflict_do_nothing(index_elements=["kot_date"])
+        )
+        last = await conn.scalar(
+            select(KotCounter.last_number).where(KotCounter.kot_date == kot_date).with_for_update()
+        )
+        numbers = await _draw(conn, kot_date, count)
+        if min(numbers) <= last:
+            # Old workers took numbers past the sequence; the ones drawn here become a gap
+            await conn.execute(text("SELECT setval(:name, :last)"), {"name": sequence_name(kot_date), "last": last})
+            numbers = await _draw(conn, kot_date, count)
+        await conn.execute(
+            update(KotCounter).where(KotCounter.kot_date == kot_date).values(last_number=max(numbers))
+        )
+    return numbers
+
+
+async def _ensure_sequence(kot_date: date) -> None:
+    if kot_date in _ensured_days:
+        return
+    async with _ensure_lock:
+        if kot_date in _ensured_days:
+            return
+        for attempt in range(3):
+            try:
+                await _create_sequence(kot_date)
+                break
+            except DBAPIError as e:
+                # Two workers racing on CREATE SEQUENCE IF NOT EXISTS can still collide in pg_type
+                if attempt == 2:
+                    raise
+                logger.info(f"KOT sequence creation for {kot_date} raced, retrying: {e}")
+        # Only today and yesterday (orders straddling midnight) are still allocated from
+        _ensured_days.difference_update([day for day in _ensured_days if day < kot_date - timedelta(days=1)])
+        _ensured_days.add(kot_date)
+
+
+async def _create_sequence(kot_date: date) -> None:
+    name = sequence_name(kot_date)
+    # DDL on its own autocommit connection, outside the caller's order transaction
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}):
+            return
+
+        # Continue after numbers already handed out today (e.g. by the old counter row)
+        last_counter = await conn.scalar(select(KotCounter.last_number).where(KotCounter.kot_date == kot_date))
+        last_order = await conn.scalar(select(func.max(Order.kot_number)).where(Order.kot_date == kot_date))
+        start = max(last_counter or 0, last_order or 0) + 1
+
+        await conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {name} START WITH {start}"))
+        logger.info(f"KOT sequence {name} ready (starts at {start}).")
+        await _drop_old_sequences(conn, kot_date)
+
+
+async def _drop_old_sequences(conn: AsyncConnection, kot_date: date) -> None:
+    cutoff = sequence_name(kot_date - timedelta(days=KOT_SEQUENCE_RETENTION_DAYS))
+    try:
+        result = await conn.execute(
+            text(
+                "SELECT sequencename FROM pg_sequences "
+                "WHERE schemaname = current_schema() AND sequencename LIKE :pattern AND sequencename < :cutoff"
+            ),
+            {"pattern": KOT_SEQUENCE_PREFIX.replace("_", "\\_") + "%", "cutoff": cutoff},
+        )
+        for old_name in result.scalars():
+            await conn.execute(text(f"DROP SEQUENCE IF EXISTS {old_name}"))
+    except Exception as e:
+        logger.warning(f"Old KOT sequence cleanup failed: {e}")
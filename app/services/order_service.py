@@ -1,19 +1,23 @@
 import uuid
-import math
 import time
 import logging
 from datetime import date, datetime, timezone
-from typing import Any, Dict
+from typing import AbstractSet, Any, Dict, List
 
-from sqlalchemy import select
+from fastapi import HTTPException
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models.order import Order, PaymentStatus, KdsStatus
-from app.db.models.kot_counter import KotCounter
-from app.db.schemas.order import OrderCreateRequest
+from app.db.schemas.order import OrderCreateRequest, OrderQuoteRequest
 from app.services.catalog_service import CatalogService
+from app.services.catalog_index import CatalogIndex
+from app.services.kot_sequence import next_kot_numbers
+from app.services.pricing import order_totals, rupees, summarize_taxes
 from app.utils.rista import RistaClient
+from app.utils.circuit_breaker import CircuitOpenError
 from app.core.config import settings
+from app.core.metrics import StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -33,151 +37,279 @@ class OrderService:
         """
         Orchestrates order creation: Fetch Catalog -> Calculate Totals -> Generate KOT -> Save DB
         """
-        # 1. Fetch & Validate Catalog
-        catalog_data = await self.catalog.get_catalog(request.channel)
-        sku_map = {item["skuCode"]: item for item in catalog_data.get("items", [])}
-        tax_map = {t["taxTypeId"]: float(t["percentage"]) for t in catalog_data.get("taxTypes", [])}
-
-        # 2. Recalculate Totals
-        backend_total_exc = 0.0
-        backend_total_inc = 0.0
+        with StageTimer("create_order") as timer:
+            timer.context["channel"] = request.channel
+
+            # 1. Fetch & Validate Catalog
+            with timer.stage("catalog"):
+                index = await self.catalog.get_catalog_index(request.channel)
+                disabled_skus = await self.catalog.get_disabled_skus(request.channel)
+
+            # 2. Recalculate Totals
+            with timer.stage("pricing"):
+                items_for_db, total_exc, total_inc = self._price_items(request, index, disabled_skus)
+
+            # 3. Generate IDs
+            order_id = self._new_order_id()
+            timer.context["order_id"] = order_id
+            with timer.stage("kot"):
+                kot_date, kot_number, kot_code = await self._generate_next_kot()
+
+            # 4. Insert, reading the stored row back in the same statement
+            stmt = insert(Order).values(
+                order_id=order_id,
+                channel=request.channel,
+                order_type=request.order_type,
+                items=items_for_db,
+                total_amount_exclude_tax=total_exc,
+                total_amount_include_tax=total_inc,
+                kot_date=kot_date,
+                kot_number=kot_number,
+                kot_code=kot_code,
+                payment_status=PaymentStatus.PENDING,
+                kds_status=KdsStatus.NOT_POSTED,
+            ).returning(Order)
+
+            with timer.stage("insert"):
+                new_order = (await self.db.execute(stmt)).scalar_one()
+            with timer.stage("commit"):
+                await self.db.commit()
+            return new_order
+
+    async def create_orders_batch(self, requests: List[OrderCreateRequest]) -> List[Dict[str, Any] | ValueError]:
+        """
+        Creates several orders at once: one catalog snapshot per channel, one
+        block of KOT numbers and a single multi-row INSERT. Returns, per
+        request in order, the inserted row values or the ValueError that
+        rejected it (including a catalog that could not be loaded for its
+        channel); rejected orders do not consume a KOT number.
+        """
+        snapshots: Dict[str, tuple[CatalogIndex, frozenset] | ValueError] = {}
+        results: List[Dict[str, Any] | ValueError] = []
+
+        for request in requests:
+            if request.channel not in snapshots:
+                try:
+                    snapshots[request.channel] = (
+                        await self.catalog.get_catalog_index(request.channel),
+                        await self.catalog.get_disabled_skus(request.channel),
+                    )
+                except HTTPException as e:
+                    # Only this channel's orders are rejected; the rest of the batch goes ahead
+                    snapshots[request.channel] = ValueError(
+                        f"Catalog unavailable for channel {request.channel}: {e.detail}"
+                    )
+            snapshot = snapshots[request.channel]
+            if isinstance(snapshot, ValueError):
+                results.append(snapshot)
+                continue
+            index, disabled_skus = snapshot
+            try:
+                items_for_db, total_exc, total_inc = self._price_items(request, index, disabled_skus)
+            except ValueError as e:
+                results.append(e)
+                continue
+            results.append({
+                "order_id": self._new_order_id(),
+                "channel": request.channel,
+                "order_type": request.order_type,
+                "items": items_for_db,
+                "total_amount_exclude_tax": total_exc,
+                "total_amount_include_tax": total_inc,
+                "payment_status": PaymentStatus.PENDING,
+                "kds_status": KdsStatus.NOT_POSTED,
+            })
+
+        rows = [row for row in results if not isinstance(row, ValueError)]
+        if not rows:
+            return results
+
+        kot_date = date.today()
+        for row, kot_number in zip(rows, await next_kot_numbers(self.db, kot_date, len(rows))):
+            row.update(kot_date=kot_date, kot_number=kot_number, kot_code=f"KTR-{kot_number}")
+
+        # One multi-row INSERT ... VALUES (...), (...) statement for the whole batch
+        await self.db.execute(insert(Order).values(rows))
+        await self.db.commit()
+        return results
+
+    async def quote_order(self, request: OrderQuoteRequest) -> Dict[str, Any]:
+        """
+        Prices a cart exactly as create_order would, with line and tax
+        breakdowns, without allocating a KOT or touching the database.
+        """
+        index = await self.catalog.get_catalog_index(request.channel)
+        disabled_skus = await self.catalog.get_disabled_skus(request.channel)
+        _, total_exc, total_inc = self._price_items(request, index, disabled_skus)
+
+        lines = [index.item(item_req.sku_code).sale_template.line(item_req.quantity) for item_req in request.items]
+        return {
+            "channel": request.channel,
+            "catalog_version": index.version,
+            "lines": [
+                {
+                    "sku_code": line.item.sku_code,
+                    "item_name": line.item.item_name,
+                    "quantity": line.quantity,
+                    "unit_price": rupees(line.item.unit_paise),
+                    "line_amount": rupees(line.amount_paise),
+                    "tax_included": rupees(line.tax_included_paise),
+                    "tax_excluded": rupees(line.tax_excluded_paise),
+                    "taxes": [
+                        {
+                            "name": tax.name,
+                            "percentage": tax.percentage,
+                            "amount_included": rupees(included),
+                            "amount_excluded": rupees(excluded),
+                        }
+                        for tax, included, excluded in line.taxes
+                    ],
+                }
+                for line in lines
+            ],
+            "item_total": rupees(sum(line.amount_paise for line in lines)),
+            "tax_included": rupees(sum(line.tax_included_paise for line in lines)),
+            "tax_excluded": rupees(sum(line.tax_excluded_paise for line in lines)),
+            "taxes": [
+                {
+                    "name": tax["name"],
+                    "percentage": tax["percentage"],
+                    "amount_included": tax["amountIncluded"],
+                    "amount_excluded": tax["amountExcluded"],
+                }
+                for tax in summarize_taxes(lines)
+            ],
+            "total_amount_exclude_tax": total_exc,
+            "total_amount_include_tax": total_inc,
+        }
+
+    @staticmethod
+    def _price_items(
+            request: OrderCreateRequest | OrderQuoteRequest, index: CatalogIndex, disabled_skus: AbstractSet[str]
+    ) -> tuple[List[Dict[str, Any]], int, int]:
+        """
+        Validates the requested lines against the catalog and recomputes the
+        totals (whole rupees, excluding and including tax).
+        """
+        lines = []
         items_for_db = []
 
         for item_req in request.items:
-            catalog_item = sku_map.get(item_req.sku_code)
+            catalog_item = index.item(item_req.sku_code)
             if not catalog_item:
                 raise ValueError(f"Invalid item SKU code: {item_req.sku_code}")
+            if catalog_item.sku_code in disabled_skus:
+                raise ValueError(f"Item out of stock: {catalog_item.item_name} ({item_req.sku_code})")
 
-            quantity = item_req.quantity
-            unit_price = float(catalog_item.get("price", 0.0))
-            line_total_price = unit_price * quantity
-
-            line_tax = 0.0
-            if not catalog_item.get("isPriceIncludesTax", False):
-                for tax_id in catalog_item.get("taxTypeIds", []):
-                    tax_pct = tax_map.get(tax_id, 0.0)
-                    line_tax += line_total_price * (tax_pct / 100.0)
-
-            backend_total_exc += line_total_price
-            backend_total_inc += line_total_price + line_tax
-
+            lines.append((catalog_item, item_req.quantity))
             items_for_db.append({
                 "sku_code": item_req.sku_code,
-                "item_name": catalog_item.get("itemName"),
-                "quantity": quantity,
-                "unit_price": unit_price,
+                "item_name": catalog_item.item_name,
+                "quantity": item_req.quantity,
+                "unit_price": catalog_item.price,
             })
 
-        # 3. Generate IDs
+        total_exc, total_inc = order_totals(lines)
+        return items_for_db, total_exc, total_inc
+
+    @staticmethod
+    def _new_order_id() -> str:
         full_uuid = str(uuid.uuid4()).upper()
-        order_id = f"KTR-{full_uuid[0:8]}{full_uuid[10:12]}"
-        kot_date, kot_number, kot_code = await self._generate_next_kot()
-
-        # 4. Create Order Object
-        new_order = Order(
-            order_id=order_id,
-            channel=request.channel,
-            order_type=request.order_type,
-            items=items_for_db,
-            total_amount_exclude_tax=math.ceil(backend_total_exc),
-            total_amount_include_tax=math.ceil(backend_total_inc),
-            kot_date=kot_date,
-            kot_number=kot_number,
-            kot_code=kot_code,
-            payment_status=PaymentStatus.PENDING,
-            kds_status=KdsStatus.NOT_POSTED,
-        )
-
-        self.db.add(new_order)
-        await self.db.commit()
-        await self.db.refresh(new_order)
-        return new_order
+        return f"KTR-{full_uuid[0:8]}{full_uuid[10:12]}"
 
     async def _generate_next_kot(self) -> tuple[date, int, str]:
         today = date.today()
-        stmt = select(KotCounter).where(KotCounter.kot_date == today).with_for_update()
-        result = await self.db.execute(stmt)
-        counter = result.scalar_one_or_none()
-
-        if counter is None:
-            counter = KotCounter(kot_date=today, last_number=0)
-            self.db.add(counter)
-            await self.db.flush()
-
-        counter.last_number += 1
-        return today, counter.last_number, f"KTR-{counter.last_number}"
+        (kot_number,) = await next_kot_numbers(self.db, today)
+        return today, kot_number, f"KTR-{kot_number}"
 
     # --- 2. KDS Posting Logic ---
     async def sync_order_to_kds(self, order: Order) -> tuple[bool, str | None]:
         """
         Posts the order to Rista KDS. Handles idempotency and 409 conflicts.
+        Raises CircuitOpenError, leaving the order untouched, while Rista's
+        circuit is open, or half-open with another call probing it.
         """
         logger.info(f"Syncing order {order.order_id} to KDS...")
 
         if order.kds_status == KdsStatus.POSTED and order.kds_invoice_id:
             return True, order.kds_invoice_id
 
-        try:
-            catalog = await self.catalog.get_catalog(order.channel)
-        except Exception as e:
-            await self._update_kds_status(order, KdsStatus.FAILED, f"Catalog error: {e}")
-            return False, None
-
-        try:
-            sale_payload = self._construct_kds_payload(order, catalog)
-        except Exception as e:
-            await self._update_kds_status(order, KdsStatus.FAILED, f"Payload build error: {e}")
-            return False, None
-
-        order.kds_last_attempt_at = datetime.now(timezone.utc)
-        order.kds_status = KdsStatus.PENDING
-        await self.db.commit()
-
-        try:
-            request_id = f"kds_{order.order_id}_{int(time.time() * 1000)}"
-            response = await self.rista.post_sale(sale_payload, request_id)
-            invoice_id = response.get("invoiceNumber")
-
-            await self._update_kds_status(order, KdsStatus.POSTED, None, invoice_id)
-            logger.info(f"✅ KDS Post Success: {order.order_id} -> Invoice: {invoice_id}")
-            return True, invoice_id
-
-        except Exception as e:
-            is_conflict = "409" in str(e) or (hasattr(e, "response") and e.response.status_code == 409)
-
-            if is_conflict:
-                logger.warning(f"Conflict for {order.order_id}, checking KDS status...")
-                invoice_id = await self.rista.get_sale_status(order.order_id)
-                if invoice_id:
+        # Not an attempt: nothing is sent, so the order keeps its status and retry timing
+        if not await self.rista.available():
+            raise CircuitOpenError("rista circuit is open")
+
+        with StageTimer("sync_order_to_kds") as timer:
+            timer.context["order_id"] = order.order_id
+            # Stamped before anything can fail, so every FAILED order backs off in the sweeper
+            order.kds_last_attempt_at = datetime.now(timezone.utc)
+
+            try:
+                with timer.stage("catalog"):
+                    index = await self.catalog.get_catalog_index(order.channel)
+            except Exception as e:
+                await self._update_kds_status(order, KdsStatus.FAILED, f"Catalog error: {e}")
+                return False, None
+
+            try:
+                with timer.stage("payload"):
+                    sale_payload = self._construct_kds_payload(order, index)
+            except Exception as e:
+                await self._update_kds_status(order, KdsStatus.FAILED, f"Payload build error: {e}")
+                return False, None
+
+            # Half-open, only the probe may post; everyone else leaves the order as it was
+            try:
+                probe = await self.rista.admit()
+            except CircuitOpenError:
+                await self.db.rollback()  # drops the attempt stamp: nothing was sent
+                raise
+
+            with timer.stage("mark_pending"):
+                order.kds_status = KdsStatus.PENDING
+                await self.db.commit()
+
+            try:
+                request_id = f"kds_{order.order_id}_{int(time.time() * 1000)}"
+                with timer.stage("rista_post"):
+                    response = await self.rista.post_sale(sale_payload, request_id, probe=probe)
+                invoice_id = response.get("invoiceNumber")
+
+                with timer.stage("status_update"):
                     await self._update_kds_status(order, KdsStatus.POSTED, None, invoice_id)
-                    return True, invoice_id
-
-            await self._update_kds_status(order, KdsStatus.FAILED, str(e))
-            logger.error(f"KDS Post Failed: {e}")
-            return False, None
-
-    def _construct_kds_payload(self, order: Order, catalog: Dict) -> Dict[str, Any]:
+                logger.info(f"✅ KDS Post Success: {order.order_id} -> Invoice: {invoice_id}")
+                return True, invoice_id
+
+            except Exception as e:
+                is_conflict = "409" in str(e) or (hasattr(e, "response") and e.response.status_code == 409)
+
+                if is_conflict:
+                    logger.warning(f"Conflict for {order.order_id}, checking KDS status...")
+                    with timer.stage("rista_status"):
+                        invoice_id = await self.rista.get_sale_status(order.order_id)
+                    if invoice_id:
+                        with timer.stage("status_update"):
+                            await self._update_kds_status(order, KdsStatus.POSTED, None, invoice_id)
+                        return True, invoice_id
+
+                timer.context["kds_error"] = type(e).__name__
+                with timer.stage("status_update"):
+                    await self._update_kds_status(order, KdsStatus.FAILED, str(e))
+                logger.error(f"KDS Post Failed: {e}")
+                return False, None
+
+    def _construct_kds_payload(self, order: Order, index: CatalogIndex) -> Dict[str, Any]:
         """Helper to build the Rista JSON payload."""
-        catalog_items = catalog.get("items", [])
-        tax_index = {t["taxTypeId"]: t for t in catalog.get("taxTypes", [])}
-
-        sale_items = []
-        sum_item_total = 0.0
-        sum_tax_inc = 0.0
-        sum_tax_exc = 0.0
-
+        lines = []
         for item_spec in order.items:
-            src_item = self.catalog.find_item(catalog_items, item_spec.get("sku_code"))
+            src_item = index.item(item_spec.get("sku_code"))
             if not src_item:
                 raise ValueError(f"SKU {item_spec.get('sku_code')} not found in catalog")
+            lines.append(src_item.sale_template.line(item_spec["quantity"]))
 
-            line, tax_inc, tax_exc = self.catalog.build_sale_item(
-                src_item, item_spec["quantity"], tax_index
-            )
-            sale_items.append(line)
-            sum_item_total += float(line["itemTotalAmount"])
-            sum_tax_inc += float(tax_inc)
-            sum_tax_exc += float(tax_exc)
+        item_total = sum(line.amount_paise for line in lines)
+        tax_inc = sum(line.tax_included_paise for line in lines)
+        tax_exc = sum(line.tax_excluded_paise for line in lines)
+        order_total = rupees(round(order.total_amount_include_tax * 100))
 
         sale_body = {
             "branchCode": settings.RISTA_BRANCH_CODE,
@@ -189,28 +321,28 @@ class OrderService:
                 "invoiceNumber": order.kot_code,
                 "invoiceDate": datetime.now(timezone.utc).isoformat(),
             },
-            "items": sale_items,
-            "itemTotalAmount": self.catalog.money(sum_item_total),
+            "items": [line.to_rista() for line in lines],
+            "itemTotalAmount": rupees(item_total),
             "payments": [
                 {
                     "mode": order.payment_method or "Digital",
-                    "amount": self.catalog.money(order.total_amount_include_tax),
+                    "amount": order_total,
                     "reference": order.provider_txn_id or order.order_id,
                     "postedDate": datetime.now(timezone.utc).isoformat(),
                 }
             ],
         }
 
-        if sum_tax_inc: sale_body["taxAmountIncluded"] = self.catalog.money(sum_tax_inc)
-        if sum_tax_exc: sale_body["taxAmountExcluded"] = self.catalog.money(sum_tax_exc)
+        if tax_inc: sale_body["taxAmountIncluded"] = rupees(tax_inc)
+        if tax_exc: sale_body["taxAmountExcluded"] = rupees(tax_exc)
 
-        bill_amount = sum_item_total + sum_tax_exc
-        sale_body["billAmount"] = self.catalog.money(bill_amount)
+        bill_amount = rupees(item_total + tax_exc)
+        sale_body["billAmount"] = bill_amount
         sale_body["roundOffAmount"] = 0.0
-        sale_body["billRoundedAmount"] = self.catalog.money(bill_amount)
-        sale_body["totalAmount"] = self.catalog.money(order.total_amount_include_tax)
+        sale_body["billRoundedAmount"] = bill_amount
+        sale_body["totalAmount"] = order_total
 
-        sale_taxes = self.catalog.summarize_taxes(sale_items)
+        sale_taxes = summarize_taxes(lines)
         if sale_taxes:
             sale_body["taxes"] = sale_taxes
 
@@ -221,4 +353,3 @@ class OrderService:
         if error: order.kds_last_error = error
         if invoice_id: order.kds_invoice_id = invoice_id
         await self.db.commit()
-        await self.db.refresh(order)
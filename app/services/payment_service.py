@@ -3,7 +3,7 @@ import httpx
 import redis.asyncio as redis
 from datetime import datetime, timezone
 from typing import Optional
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
@@ -14,7 +14,9 @@ from app.utils.phonepe import (
 )
 from app.db.models.order import Order, PaymentStatus, KdsStatus, PaymentMethod
 from app.services.order_service import OrderService
+from app.services import kds_outbox
 from app.services.catalog_service import CatalogService
+from app.services.idempotency import UpstreamHTTPException
 from app.utils.rista import RistaClient
 from app.db.session import SessionLocal
 
@@ -77,7 +79,7 @@ class PaymentService:
         url = settings.PHONEPE_BASE_URL + endpoint
 
         try:
-            resp = await self.http_client.post(url, json={"request": base64_payload}, headers=headers, timeout=30.0)
+            resp = await self.http_client.post(url, json={"request": base64_payload}, headers=headers, timeout=settings.PAYMENT_INIT_TIMEOUT_SECONDS)
             resp.raise_for_status()
             payload = resp.json()
 
@@ -99,12 +101,11 @@ class PaymentService:
                 order.qr_expires_at = compute_qr_expiry(datetime.now(timezone.utc), int(expires_in))
 
             await self.db.commit()
-            await self.db.refresh(order)
             return order
 
         except httpx.HTTPStatusError as e:
             logger.error(f"QR Init HTTP Error: {e.response.status_code} - {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail=f"Payment Gateway Error: {e.response.text}")
+            raise UpstreamHTTPException(status_code=e.response.status_code, detail=f"Payment Gateway Error: {e.response.text}")
         except Exception as e:
             logger.error(f"QR Init Failed: {e}", exc_info=True)
             raise HTTPException(status_code=502, detail="Payment Gateway Error")
@@ -153,7 +154,7 @@ class PaymentService:
         logger.info(request_payload)
 
         try:
-            resp = await self.http_client.post(url, json=request_payload, headers=headers, timeout=30.0)
+            resp = await self.http_client.post(url, json=request_payload, headers=headers, timeout=settings.PAYMENT_INIT_TIMEOUT_SECONDS)
             resp.raise_for_status()
             payload = resp.json()
             logger.info(f"Pine Labs Response: {payload}")
@@ -168,12 +169,11 @@ class PaymentService:
             order.provider_txn_id = order_id
 
             await self.db.commit()
-            await self.db.refresh(order)
             return order
 
         except httpx.HTTPStatusError as e:
             logger.error(f"Pine Labs Init HTTP Error: {e.response.status_code} - {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail=f"EDC Gateway Error: {e.response.text}")
+            raise UpstreamHTTPException(status_code=e.response.status_code, detail=f"EDC Gateway Error: {e.response.text}")
         except Exception as e:
             logger.error(f"Pine Labs Init Failed: {e}", exc_info=True)
             raise HTTPException(status_code=502, detail="EDC Error")
@@ -183,25 +183,31 @@ class PaymentService:
         if pin != settings.CASH_PAYMENT_PIN:
             raise HTTPException(status_code=401, detail="Invalid PIN for cash payment")
 
-        stmt = select(Order).where(Order.order_id == order_id)
+        # PENDING/FAILED -> COMPLETED in one UPDATE ... RETURNING
+        stmt = (
+            update(Order)
+            .where(Order.order_id == order_id, Order.payment_status != PaymentStatus.COMPLETED)
+            .values(
+                store_id=store_id if store_id else getattr(settings, "STORE_ID", None),
+                payment_method=PaymentMethod.CASH,
+                payment_status=PaymentStatus.COMPLETED,
+                provider_txn_id=f"CASH-{order_id}",
+                provider_code="SUCCESS",
+                provider_resp={"message": "Cash payment recorded"},
+            )
+            .returning(Order)
+        )
         order = (await self.db.execute(stmt)).scalar_one_or_none()
         if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-
-        if order.payment_status == PaymentStatus.COMPLETED:
+            order = (await self.db.execute(select(Order).where(Order.order_id == order_id))).scalar_one_or_none()
+            if not order:
+                raise HTTPException(status_code=404, detail="Order not found")
+            # Already completed
             return order
 
-        order.store_id = store_id if store_id else getattr(settings, "STORE_ID", None)
-        order.payment_method = PaymentMethod.CASH
-        order.payment_status = PaymentStatus.COMPLETED
-        order.provider_txn_id = f"CASH-{order_id}"
-        order.provider_code = "SUCCESS"
-        order.provider_resp = {"message": "Cash payment recorded"}
-
+        await kds_outbox.enqueue(self.db, order.order_id)
         await self.db.commit()
-        await self.db.refresh(order)
-
-        await self.order_service.sync_order_to_kds(order)
+        kds_outbox.notify()
 
         return order
 
@@ -212,9 +218,8 @@ class PaymentService:
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
 
-        # 1. If final, try KDS
+        # 1. Final; the KDS post is the outbox's job
         if order.payment_status == PaymentStatus.COMPLETED:
-            await self.order_service.sync_order_to_kds(order)
             return order
 
         # 2. Check Provider
@@ -270,10 +275,11 @@ class PaymentService:
                 order.payment_status = new_status
                 order.provider_resp = data
                 order.provider_code = str(response_code)
+                if new_status == PaymentStatus.COMPLETED:
+                    await kds_outbox.enqueue(self.db, order.order_id)
                 await self.db.commit()
-
-            if new_status == PaymentStatus.COMPLETED:
-                await self.order_service.sync_order_to_kds(order)
+                if new_status == PaymentStatus.COMPLETED:
+                    kds_outbox.notify()
 
             return order
 
@@ -310,10 +316,11 @@ class PaymentService:
                 order.payment_status = new_status
                 order.provider_code = code
                 order.provider_resp = data
+                if new_status == PaymentStatus.COMPLETED:
+                    await kds_outbox.enqueue(self.db, order.order_id)
                 await self.db.commit()
-
-            if new_status == PaymentStatus.COMPLETED:
-                await self.order_service.sync_order_to_kds(order)
+                if new_status == PaymentStatus.COMPLETED:
+                    kds_outbox.notify()
 
             return order
 
@@ -329,26 +336,24 @@ class PaymentService:
         Logic for processing webhook notification.
         Supports both background task and direct call.
         """
-        stmt = select(Order).where(Order.order_id == merchant_order_id)
-        result = await self.db.execute(stmt)
-        order = result.scalar_one_or_none()
+        values = {"provider_code": code, "provider_resp": payload}
+        if code == "PAYMENT_SUCCESS":
+            values["payment_status"] = PaymentStatus.COMPLETED
+        elif code in ("PAYMENT_ERROR", "PAYMENT_DECLINED", "PAYMENT_CANCELLED"):
+            values["payment_status"] = PaymentStatus.FAILED
+
+        stmt = update(Order).where(Order.order_id == merchant_order_id).values(**values).returning(Order)
+        order = (await self.db.execute(stmt)).scalar_one_or_none()
         if not order:
             logger.error(f"Order {merchant_order_id} not found during webhook processing")
             return
 
-        order.provider_code = code
-        order.provider_resp = payload
-
-        if code == "PAYMENT_SUCCESS":
-            order.payment_status = PaymentStatus.COMPLETED
-        elif code in ("PAYMENT_ERROR", "PAYMENT_DECLINED", "PAYMENT_CANCELLED"):
-            order.payment_status = PaymentStatus.FAILED
-
+        if order.payment_status == PaymentStatus.COMPLETED:
+            await kds_outbox.enqueue(self.db, order.order_id)
         await self.db.commit()
-        await self.db.refresh(order)
 
         if order.payment_status == PaymentStatus.COMPLETED:
-            await self.order_service.sync_order_to_kds(order)
+            kds_outbox.notify()
 
     # --- BACKGROUND TASK ---
 
@@ -359,6 +364,8 @@ class PaymentService:
             payload: dict,
             http_client: httpx.AsyncClient,
             redis_client: redis.Redis,
+            rista_client: RistaClient,
+            blob_redis_client: redis.Redis | None = None,
     ):
         """
         Runs webhook processing in a background task with its own DB session.
@@ -367,8 +374,7 @@ class PaymentService:
         logger.info(f"Background webhook task running for order {merchant_order_id}...")
 
         async with SessionLocal() as db:
-            rista_client = RistaClient(http_client)
-            catalog_service = CatalogService(redis_client, rista_client)
+            catalog_service = CatalogService(redis_client, rista_client, blob_redis_client)
             order_service = OrderService(db, catalog_service, rista_client)
             payment_service = PaymentService(db, http_client, redis_client, order_service)
 
@@ -0,0 +1,172 @@
+"""
+Integer-paise pricing for orders and Rista KDS sale payloads.
+
+Everything is computed from the per-SKU values CatalogIndex precomputes
+(unit price in paise, tax rates in parts per million) and each item's
+SaleLineTemplate, so a line costs a few integer multiply-adds. Rupee floats
+are produced only when building output.
+Rounding matches the previous float code: order totals are rounded up to
+whole rupees, and each tax amount on a sale line is rounded half-up to the paisa.
+"""
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple
+
+if TYPE_CHECKING:
+    from app.services.catalog_index import IndexedItem, IndexedTax
+
+PPM = 1_000_000
+
+# Lines for quantities up to this are priced once per catalog version and reused
+CACHED_QUANTITIES = 20
+
+
+def round_half_up(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded half-up, for non-negative values."""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def ceil_div(numerator: int, denominator: int) -> int:
+    return -(-numerator // denominator)
+
+
+def rupees(paise: int) -> float:
+    return paise / 100
+
+
+def order_totals(lines: Iterable[Tuple["IndexedItem", int]]) -> Tuple[int, int]:
+    """
+    (total excluding tax, total including tax) for (item, quantity) lines, in
+    whole rupees rounded up. Tax on tax-exclusive items is summed exactly
+    before rounding; tax-inclusive prices count as-is.
+    """
+    exclude_paise = 0
+    exclusive_tax_ppm = 0  # paise * PPM
+    for item, qty in lines:
+        line_paise = item.unit_paise * qty
+        exclude_paise += line_paise
+        exclusive_tax_ppm += line_paise * item.exclusive_tax_ppm
+    include_ppm = exclude_paise * PPM + exclusive_tax_ppm
+    return ceil_div(exclude_paise, 100), ceil_div(include_ppm, 100 * PPM)
+
+
+class SaleLineTemplate:
+    """
+    The quantity-independent part of one SKU's sale line, built with the
+    catalog index (once per catalog version). Each tax row carries its unit
+    component, unit paise x rate, and the divisor that turns a multiple of it
+    into paise, so pricing a line is a multiply and a rounded divide per tax.
+    Priced lines for small quantities are kept and shared (see line()).
+    """
+
+    __slots__ = ("item", "sku_code", "short_name", "unit_paise", "unit_price", "includes_tax", "taxes", "_lines")
+
+    def __init__(self, item: "IndexedItem"):
+        self.item = item
+        self.sku_code = item.raw["skuCode"]
+        self.short_name = item.item_name
+        self.unit_paise = item.unit_paise
+        self.unit_price = rupees(item.unit_paise)
+        self.includes_tax = item.price_includes_tax
+        # Tax included in the price is carved out of it; otherwise it is added on top
+        self.taxes: Tuple[Tuple["IndexedTax", int, int], ...] = tuple(
+            (tax, item.unit_paise * tax.rate_ppm, PPM + tax.rate_ppm if self.includes_tax else PPM)
+            for tax in item.taxes
+        )
+        self._lines: Dict[int, "SaleLine"] = {}
+
+    def line(self, quantity: int) -> "SaleLine":
+        """The priced line for a quantity; shared between orders, so treat it (and its to_rista()) as read-only."""
+        quantity = int(quantity)
+        if (cached := self._lines.get(quantity)) is not None:
+            return cached
+        line = SaleLine(self.item, quantity)
+        if 0 < quantity <= CACHED_QUANTITIES:
+            self._lines[quantity] = line
+        return line
+
+
+class SaleLine:
+    """One priced sale line: the Rista item dict plus its integer amounts."""
+
+    __slots__ = (
+        "item", "template", "quantity", "amount_paise", "tax_included_paise", "tax_excluded_paise", "taxes", "_rista",
+    )
+
+    def __init__(self, item: "IndexedItem", quantity: int):
+        template = item.sale_template
+        self.item = item
+        self.template = template
+        self.quantity = int(quantity)
+        self.amount_paise = template.unit_paise * self.quantity
+        # (tax, amount included, amount excluded) per tax row, each rounded to the paisa
+        self.taxes: List[Tuple[Any, int, int]] = []
+        self.tax_included_paise = 0
+        self.tax_excluded_paise = 0
+        self._rista: Dict[str, Any] | None = None
+        for tax, unit_component, divisor in template.taxes:
+            amount = round_half_up(unit_component * self.quantity, divisor)
+            if template.includes_tax:
+                self.taxes.append((tax, amount, 0))
+                self.tax_included_paise += amount
+            else:
+                self.taxes.append((tax, 0, amount))
+                self.tax_excluded_paise += amount
+
+    def to_rista(self) -> Dict[str, Any]:
+        """The Rista sale item dict, built once per line."""
+        if self._rista is not None:
+            return self._rista
+        item_amount = rupees(self.amount_paise)
+        line: Dict[str, Any] = {
+            "shortName": self.template.short_name,
+            "skuCode": self.template.sku_code,
+            "quantity": self.quantity,
+            "unitPrice": self.template.unit_price,
+            "itemAmount": item_amount,
+            "itemNature": "Service",
+            "itemTotalAmount": item_amount,
+        }
+        if self.taxes:
+            if self.tax_included_paise:
+                line["taxAmountIncluded"] = rupees(self.tax_included_paise)
+            if self.tax_excluded_paise:
+                line["taxAmountExcluded"] = rupees(self.tax_excluded_paise)
+            line["taxes"] = [
+                {
+                    "name": tax.name,
+                    "percentage": tax.percentage,
+                    "saleAmount": item_amount,
+                    "amountIncluded": rupees(included),
+                    "amountExcluded": rupees(excluded),
+                    "amount": rupees(included + excluded),
+                }
+                for tax, included, excluded in self.taxes
+            ]
+        self._rista = line
+        return line
+
+
+def summarize_taxes(lines: Iterable[SaleLine]) -> List[Dict[str, Any]]:
+    """Sale-level tax summary, grouped by (name, percentage) like Rista expects."""
+    agg: Dict[tuple, List[int]] = {}
+    for line in lines:
+        for tax, included, excluded in line.taxes:
+            sums = agg.setdefault((tax.name, tax.percentage), [0, 0, 0])
+            sums[0] += line.amount_paise
+            sums[1] += included
+            sums[2] += excluded
+
+    return [
+        {
+            "name": name,
+            "percentage": percentage,
+            "saleAmount": rupees(sale),
+            "itemTaxIncluded": rupees(included),
+            "itemTaxExcluded": rupees(excluded),
+            "chargeTaxIncluded": 0.0,
+            "chargeTaxExcluded": 0.0,
+            "amountIncluded": rupees(included),
+            "amountExcluded": rupees(excluded),
+            "amount": rupees(included + excluded),
+        }
+        for (name, percentage), (sale, included, excluded) in agg.items()
+    ]
@@ -0,0 +1,147 @@
+"""
+Circuit breaker for an upstream API, with its state shared through Redis so
+every worker trips and recovers together.
+
+Closed: calls go through and each outcome is counted in a fixed window of
+`window_seconds`. Once the window holds at least `min_calls` with a failure
+share of `failure_rate` or more, the circuit opens.
+Open: calls raise CircuitOpenError immediately, for `open_seconds`.
+Half-open: one call across all workers (claimed with SET NX) probes the
+upstream; success closes the circuit, failure opens it again. Everyone else
+keeps failing fast until the probe reports.
+
+Redis errors never block calls: the breaker then lets everything through.
+"""
+import time
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Local copy of the shared state, so a burst of calls costs one Redis read
+STATE_CACHE_SECONDS = 1.0
+
+circuit_state = metrics.gauge("kiosk_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open.")
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+            self,
+            name: str,
+            redis_client: redis.Redis,
+            window_seconds: int,
+            min_calls: int,
+            failure_rate: float,
+            open_seconds: int,
+            probe_timeout_seconds: int,
+    ):
+        self.name = name
+        self.redis = redis_client
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        # A probe whose worker died is abandoned after this and another one may go out
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self._open_key = f"circuit:{name}:open"
+        self._half_open_key = f"circuit:{name}:half_open"
+        self._probe_key = f"circuit:{name}:probe"
+        self._state = CLOSED
+        self._state_checked_at = 0.0
+
+    def _window_key(self) -> str:
+        return f"circuit:{self.name}:calls:{int(time.time() // self.window_seconds)}"
+
+    def _set_local(self, state: str) -> None:
+        self._state = state
+        self._state_checked_at = time.monotonic()
+        circuit_state.set(_STATE_VALUES[state], name=self.name)
+
+    async def state(self) -> str:
+        if time.monotonic() - self._state_checked_at < STATE_CACHE_SECONDS:
+            return self._state
+        try:
+            is_open, half_open = await self.redis.mget(self._open_key, self._half_open_key)
+        except Exception as e:
+            logger.debug(f"Circuit '{self.name}' state read failed, treating as closed: {e}")
+            return CLOSED
+        self._set_local(OPEN if is_open else HALF_OPEN if half_open else CLOSED)
+        return self._state
+
+    async def before_call(self) -> bool:
+        """
+        Raises CircuitOpenError if the call must not go out. Returns True when
+        this call is the half-open probe; pass that on to record().
+        """
+        state = await self.state()
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN:
+            try:
+                claimed = await self.redis.set(self._probe_key, "1", nx=True, ex=self.probe_timeout_seconds)
+            except Exception:
+                return False
+            if claimed:
+                return True
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    async def record(self, success: bool, probe: bool = False) -> None:
+        try:
+            if probe:
+                if success:
+                    await self._close()
+                else:
+                    await self._trip("half-open probe failed")
+                return
+            key = self._window_key()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(key, "ok" if success else "fail", 1)
+                pipe.hmget(key, "ok", "fail")
+                pipe.expire(key, self.window_seconds * 2)
+                _, (ok, fail), _ = await pipe.execute()
+            if success:
+                return
+            ok, fail = int(ok or 0), int(fail or 0)
+            total = ok + fail
+            if total >= self.min_calls and fail / total >= self.failure_rate:
+                await self._trip(f"{fail}/{total} calls failed")
+        except Exception as e:
+            logger.debug(f"Circuit '{self.name}' outcome not recorded: {e}")
+
+    async def _trip(self, reason: str) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._open_key, "1", ex=self.open_seconds)
+            # Outlives the open key; cleared by a successful probe
+            pipe.set(self._half_open_key, "1", ex=self.open_seconds * 20)
+            pipe.delete(self._probe_key, self._window_key())
+            await pipe.execute()
+        self._set_local(OPEN)
+        logger.warning(f"Circuit '{self.name}' opened for {self.open_seconds}s: {reason}")
+
+    async def _close(self) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._half_open_key)
+            pipe.delete(self._open_key, self._probe_key, self._window_key())
+            was_half_open, _ = await pipe.execute()
+        self._set_local(CLOSED)
+        # A worker still holding the half-open state locally may probe once more; log the real close only
+        if was_half_open:
+            logger.info(f"Circuit '{self.name}' closed: half-open probe succeeded")
+
+
+def is_failure(status_code: Optional[int]) -> bool:
+    """Transport errors, 5xx and 429 count against the upstream; other 4xx are the caller's problem."""
+    return status_code is None or status_code >= 500 or status_code == 429
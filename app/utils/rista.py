@@ -5,20 +5,77 @@ import logging
 from typing import Any, Dict, Optional
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core import metrics
+from app.utils.circuit_breaker import OPEN, CircuitBreaker, is_failure
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # optional: HTTP/2 to Rista is skipped without it
+    h2 = None
 
 logger = logging.getLogger(__name__)
 
+rista_seconds = metrics.histogram("kiosk_rista_request_duration_seconds", "Rista API latency by endpoint and status.")
+
+
+def create_rista_http_client() -> httpx.AsyncClient:
+    """
+    Connection pool for Rista only, so slow Rista calls cannot take the
+    connections the payment gateways need (and vice versa).
+    """
+    http2 = settings.RISTA_HTTP2 and h2 is not None
+    if settings.RISTA_HTTP2 and not http2:
+        logger.warning("RISTA_HTTP2 is set but the h2 package is not installed; using HTTP/1.1.")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.RISTA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.RISTA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.RISTA_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(settings.RISTA_TIMEOUT_SECONDS, connect=settings.RISTA_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+def create_rista_breaker(redis_client) -> Optional[CircuitBreaker]:
+    """Circuit breaker shared by every worker's RistaClient; None when disabled or without Redis."""
+    if not settings.RISTA_CIRCUIT_ENABLED or redis_client is None:
+        return None
+    return CircuitBreaker(
+        "rista",
+        redis_client,
+        window_seconds=settings.RISTA_CIRCUIT_WINDOW_SECONDS,
+        min_calls=settings.RISTA_CIRCUIT_MIN_CALLS,
+        failure_rate=settings.RISTA_CIRCUIT_FAILURE_RATE,
+        open_seconds=settings.RISTA_CIRCUIT_OPEN_SECONDS,
+        probe_timeout_seconds=int(settings.RISTA_TIMEOUT_SECONDS) + 5,
+    )
+
+
 class RistaClient:
-    def __init__(self, http_client: httpx.AsyncClient):
+    def __init__(self, http_client: httpx.AsyncClient, breaker: Optional[CircuitBreaker] = None):
         self.client = http_client
+        # While open, calls raise CircuitOpenError without touching the network
+        self.breaker = breaker
         self.base_url = settings.RISTA_BASE_URL
         self.branch_code = settings.RISTA_BRANCH_CODE
+        self.timeout = httpx.Timeout(settings.RISTA_TIMEOUT_SECONDS, connect=settings.RISTA_CONNECT_TIMEOUT_SECONDS)
+        # Signed token for requests without a request id, reused until it expires
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
 
     def _generate_token(self, request_id: Optional[str] = None) -> str:
+        # A jti must be unique per request, so those tokens are always signed fresh
+        if not request_id and self._token and time.monotonic() < self._token_expires_at:
+            return self._token
         now = int(time.time())
         payload = {"iss": settings.RISTA_PI_KEY, "iat": now}
         if request_id: payload["jti"] = f"{request_id}_{now}"
-        return jwt.encode(payload, settings.RISTA_SECRET_KEY, algorithm="HS256")
+        token = jwt.encode(payload, settings.RISTA_SECRET_KEY, algorithm="HS256")
+        if not request_id:
+            self._token = token
+            self._token_expires_at = time.monotonic() + settings.RISTA_TOKEN_TTL_SECONDS
+        return token
 
     def _get_headers(self, request_id: Optional[str] = None) -> Dict[str, str]:
         return {
@@ -27,24 +84,63 @@ class RistaClient:
             "content-type": "application/json",
         }
 
+    async def _send(
+            self, endpoint: str, method: str, path: str, probe: Optional[bool] = None, **kwargs: Any
+    ) -> httpx.Response:
+        """
+        One Rista call, timed into the per-endpoint latency histogram and counted
+        by the circuit breaker. `probe` is the result of an earlier admit() for
+        this call; None admits it here.
+        """
+        if probe is None:
+            probe = await self.admit()
+        started = time.perf_counter()
+        status_code: Optional[int] = None
+        try:
+            response = await self.client.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            rista_seconds.observe(
+                time.perf_counter() - started, endpoint=endpoint, status=str(status_code or "error")
+            )
+            if self.breaker:
+                await self.breaker.record(not is_failure(status_code), probe)
+
+    async def available(self) -> bool:
+        """False while the circuit is open, i.e. calls would fail fast."""
+        return self.breaker is None or await self.breaker.state() != OPEN
+
+    async def admit(self) -> bool:
+        """
+        Raises CircuitOpenError unless a call may go out now; half-open, only
+        the probe may. Returns True for the probe. Pass the result to the call
+        (post_sale(probe=...)) to admit it before doing work that depends on it.
+        """
+        return await self.breaker.before_call() if self.breaker else False
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
     async def fetch_catalog_raw(self, channel: str) -> Dict[str, Any]:
-        url = f"{self.base_url}/catalog"
         params = {"branch": self.branch_code, "channel": channel}
-        response = await self.client.get(url, headers=self._get_headers(), params=params, timeout=30)
+        response = await self._send("catalog", "GET", "/catalog", headers=self._get_headers(), params=params)
         response.raise_for_status()
         return response.json()
 
-    async def post_sale(self, sale_payload: Dict[str, Any], request_id: str) -> Dict[str, Any]:
-        url = f"{self.base_url}/sale"
-        response = await self.client.post(url, headers=self._get_headers(request_id), json=sale_payload, timeout=30)
+    async def post_sale(
+            self, sale_payload: Dict[str, Any], request_id: str, probe: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        response = await self._send(
+            "post_sale", "POST", "/sale", probe=probe, headers=self._get_headers(request_id), json=sale_payload
+        )
         response.raise_for_status()
         return response.json()
 
     async def get_sale_status(self, order_transaction_id: str) -> Optional[str]:
-        url = f"{self.base_url}/sale"
         params = {"orderTransactionId": order_transaction_id}
         try:
-            response = await self.client.get(url, headers=self._get_headers(), params=params, timeout=30)
+            response = await self._send("sale_status", "GET", "/sale", headers=self._get_headers(), params=params)
             if response.status_code == 200:
                 data = response.json()
                 if data and isinstance(data, list) and len(data) > 0:
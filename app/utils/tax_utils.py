@@ -1,8 +1,9 @@
 """
-Tax calculation utilities for Rista KDS payload building.
+Float tax calculation helpers for Rista KDS payload building.
 
-These functions were extracted from CatalogService — they are pure math
-helpers with no dependency on catalog fetching or caching concerns.
+The request path now prices in integer paise (app.services.pricing); these
+are kept as the reference implementation benchmarks/bench_pricing.py checks
+the engine against.
 """
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, List, Optional
@@ -0,0 +1,45 @@
+"""
+Stored size and decode time of the catalog cache formats.
+
+"legacy" is the old path: plain json.dumps string read through a
+decode_responses=True client (bytes -> str -> dict). The others are
+catalog_codec blobs read through the binary client (bytes -> dict).
+
+Usage: python -m benchmarks.bench_catalog_encoding [n_items]
+"""
+import sys
+import json
+import timeit
+
+from app.services import catalog_codec
+from benchmarks.bench_catalog_index import make_catalog
+
+
+def main() -> None:
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    catalog = make_catalog(n_items)
+    for item in catalog["items"]:
+        item.update({"description": "Crisp dose with benne and potato palya", "imageURL": "https://example.com/x.jpg"})
+
+    legacy = json.dumps(catalog).encode("utf-8")
+    body = json.dumps(catalog, separators=(",", ":")).encode("utf-8")
+
+    formats = {"legacy": (legacy, lambda raw: json.loads(raw.decode("utf-8")))}
+    for name, codec in catalog_codec.CODECS.items():
+        if not catalog_codec.available(codec):
+            print(f"{name}: skipped (library not installed)")
+            continue
+        blob = catalog_codec.encode(body, codec, 6 if codec != catalog_codec.CODEC_ZSTD else 3)
+        formats[name] = (blob, lambda raw: json.loads(catalog_codec.decode(raw)))
+
+    print(f"items={n_items}")
+    print(f"{'format':8} {'bytes':>10} {'ratio':>7} {'decode ms':>10}")
+    for name, (raw, decode) in formats.items():
+        assert decode(raw) == catalog
+        runs = 50
+        seconds = min(timeit.repeat(lambda: decode(raw), number=runs, repeat=3)) / runs
+        print(f"{name:8} {len(raw):>10} {len(raw) / len(legacy):>7.2f} {seconds * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Per-order catalog lookup cost: rebuilding dicts + linear find_item vs CatalogIndex.
+
+Usage: python -m benchmarks.bench_catalog_index [n_items] [lines_per_order]
+"""
+import sys
+import random
+import timeit
+
+from app.services.catalog_index import CatalogIndex
+from app.utils.tax_utils import find_item
+
+
+def make_catalog(n_items: int) -> dict:
+    taxes = [
+        {"taxTypeId": "cgst", "percentage": 2.5, "name": "CGST"},
+        {"taxTypeId": "sgst", "percentage": 2.5, "name": "SGST"},
+    ]
+    items = [
+        {
+            "skuCode": str(i),
+            "itemName": f"Item {i}",
+            "price": 50 + i % 200,
+            "status": "Active" if i % 10 else "Inactive",
+            "isPriceIncludesTax": bool(i % 3 == 0),
+            "taxTypeIds": ["cgst", "sgst"],
+        }
+        for i in range(n_items)
+    ]
+    return {"categories": [], "items": items, "taxTypes": taxes}
+
+
+def old_order_path(catalog: dict, skus: list) -> dict:
+    # create_order: per-order dicts
+    sku_map = {item["skuCode"]: item for item in catalog.get("items", [])}
+    tax_map = {t["taxTypeId"]: float(t["percentage"]) for t in catalog.get("taxTypes", [])}
+    for sku in skus:
+        item = sku_map.get(sku)
+        for tax_id in item.get("taxTypeIds", []):
+            tax_map.get(tax_id, 0.0)
+    # _construct_kds_payload: per-order tax index + linear scan per line
+    tax_index = {t["taxTypeId"]: t for t in catalog.get("taxTypes", [])}
+    for sku in skus:
+        find_item(catalog["items"], sku)
+    return tax_index
+
+
+def new_order_path(index: CatalogIndex, skus: list) -> None:
+    for sku in skus:
+        item = index.item(sku)
+        for tax_id in item.tax_type_ids:
+            index.tax_percentage(tax_id)
+    for sku in skus:
+        index.item(sku)
+
+
+def main() -> None:
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    catalog = make_catalog(n_items)
+    active = [it["skuCode"] for it in catalog["items"] if it["status"] == "Active"]
+    skus = random.Random(42).sample(active, lines)
+
+    build = min(timeit.repeat(lambda: CatalogIndex.build(catalog, "v1"), number=10, repeat=3)) / 10
+    index = CatalogIndex.build(catalog, "v1")
+    runs = 200
+    old = min(timeit.repeat(lambda: old_order_path(catalog, skus), number=runs, repeat=3)) / runs
+    new = min(timeit.repeat(lambda: new_order_path(index, skus), number=runs, repeat=3)) / runs
+
+    print(f"items={n_items} lines/order={lines}")
+    print(f"index build (once per version): {build * 1e3:8.3f} ms")
+    print(f"old per-order lookups:          {old * 1e6:8.1f} us")
+    print(f"CatalogIndex per-order lookups: {new * 1e6:8.1f} us  ({old / new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
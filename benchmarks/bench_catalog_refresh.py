@@ -0,0 +1,72 @@
+"""
+Rista catalog fetches per burst of reads on a worker without Redis (e.g. the KDS outbox).
+
+Reads the catalog repeatedly with the L1 TTL and lock wait scaled down, so
+every read after the first takes the "nothing shared" path, and checks that
+Rista is fetched once per soft TTL rather than once per lock wait.
+Catalog snapshots go to POSTGRES_DB_URL; the rows it writes are removed afterwards.
+
+Usage: python -m benchmarks.bench_catalog_refresh [reads]
+"""
+import sys
+import time
+import asyncio
+
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.db.models.menu import Menu
+from app.db.session import SessionLocal, engine
+from app.services.catalog_cache import catalog_l1_cache
+from app.services.catalog_service import CatalogService
+from benchmarks.bench_catalog_index import make_catalog
+
+BENCH_CHANNEL = "bench-refresh"
+
+
+class CountingRista:
+    def __init__(self):
+        self.fetches = 0
+
+    async def fetch_catalog_raw(self, channel: str) -> dict:
+        self.fetches += 1
+        return make_catalog(50)
+
+
+async def read_burst(soft_ttl: int, reads: int) -> int:
+    settings.CATALOG_SOFT_TTL_SECONDS = soft_ttl
+    catalog_l1_cache.clear()
+    rista = CountingRista()
+    service = CatalogService(None, rista, None)
+    for _ in range(reads):
+        await service.get_entry(BENCH_CHANNEL)
+        await asyncio.sleep(catalog_l1_cache.ttl_seconds * 2)
+    # Let a refresh started by the last read finish before counting
+    await asyncio.sleep(0.05)
+    return rista.fetches
+
+
+async def main() -> None:
+    reads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    catalog_l1_cache.ttl_seconds = 0.01
+    settings.CATALOG_LOCK_WAIT_SECONDS = 0.02
+
+    try:
+        started = time.perf_counter()
+        fetches = await read_burst(3600, reads)
+        elapsed = time.perf_counter() - started
+        print(f"{reads} reads in {elapsed:.2f}s, soft TTL 3600s: {fetches} Rista fetch(es)")
+        assert fetches == 1, f"expected 1 Rista fetch within the soft TTL, got {fetches}"
+
+        fetches = await read_burst(0, reads)
+        print(f"{reads} reads, soft TTL 0s:    {fetches} Rista fetch(es)")
+        assert fetches > 1, "a stale copy was never refreshed"
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(Menu).where(Menu.channel == BENCH_CHANNEL))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
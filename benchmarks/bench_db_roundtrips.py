@@ -0,0 +1,136 @@
+"""
+SQL statements per write path (order creation, payment initiation, webhook, KDS outbox).
+
+Runs each service call once in its own session, like one request, against
+POSTGRES_DB_URL with the payment gateways and Rista replaced by canned
+responses, and checks how many statements reached Postgres against the
+expected count for each path (printing the count from before the
+refresh-after-commit round trips were dropped where it differed). Exits with
+an AssertionError if any path regressed. Needs a scratch database; the orders
+it creates are removed afterwards.
+
+Usage: python -m benchmarks.bench_db_roundtrips
+"""
+import asyncio
+
+import httpx
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.db import query_counter
+from app.db.session import Base, SessionLocal, engine
+from app.db.models.order import Order, OrderType
+from app.db.schemas.order import OrderCreateRequest, OrderItemCreate
+from app.services import kds_outbox
+from app.services.catalog_index import CatalogIndex
+from app.services.order_service import OrderService
+from app.services.payment_service import PaymentService
+from benchmarks.bench_catalog_index import make_catalog
+
+BENCH_CHANNEL = "bench-db"
+
+# "<label>: <count>, expected <n>" for every path off its expected count
+mismatches: list[str] = []
+
+
+class CannedCatalog:
+    def __init__(self):
+        self.index = CatalogIndex.build(make_catalog(50), "bench")
+
+    async def get_catalog_index(self, channel: str) -> CatalogIndex:
+        return self.index
+
+    async def get_disabled_skus(self, channel: str) -> frozenset:
+        return frozenset()
+
+
+class CannedRista:
+    async def available(self) -> bool:
+        return True
+
+    async def admit(self) -> bool:
+        return False
+
+    async def post_sale(self, payload: dict, request_id: str, probe: bool | None = None) -> dict:
+        return {"invoiceNumber": f"INV-{payload['sourceInfo']['orderTransactionId']}"}
+
+    async def get_sale_status(self, order_id: str):
+        return None
+
+
+def gateway(request: httpx.Request) -> httpx.Response:
+    if "UploadBilledTransaction" in request.url.path:
+        return httpx.Response(200, json={"ResponseCode": 0, "ResponseMessage": "APPROVED", "PlutusTransactionReferenceID": 42})
+    return httpx.Response(200, json={"code": "SUCCESS", "data": {"qrString": "upi://pay?x=1", "expiresIn": 180}})
+
+
+async def measure(label: str, call, expected: int | None = None, before: int | None = None) -> object:
+    async with SessionLocal() as db:
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(gateway), base_url="http://gateway")
+        orders = OrderService(db, CannedCatalog(), CannedRista())
+        payments = PaymentService(db, http_client, None, orders)
+        counter = query_counter.start_counting()
+        result = await call(orders, payments)
+        count = counter[0]
+        was = f"  (was {before})" if before is not None else ""
+        print(f"{label:<34} {count:>3} statements{was}")
+        if expected is not None and count != expected:
+            mismatches.append(f"{label}: {count}, expected {expected}")
+        await http_client.aclose()
+        return result
+
+
+def new_order_request() -> OrderCreateRequest:
+    return OrderCreateRequest(
+        channel=BENCH_CHANNEL,
+        order_type=OrderType.DINEIN,
+        items=[OrderItemCreate(sku_code="1", quantity=2), OrderItemCreate(sku_code="3", quantity=1)],
+        total_amount_include_tax=0,
+        total_amount_exclude_tax=0,
+    )
+
+
+async def main() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    query_counter.install(engine)
+
+    async def create(orders, payments):
+        return (await orders.create_order(new_order_request())).order_id
+
+    async def drain_outbox(orders, payments):
+        jobs = await kds_outbox.claim(orders.db, 1)
+        await orders.db.commit()
+        for job in jobs:
+            await kds_outbox.deliver(orders.db, orders, job)
+
+    try:
+        # Warm the per-day KOT sequence so its one-time DDL is not counted
+        await measure("create order (first of the day)", create)
+
+        qr_order = await measure("POST /orders/", create, expected=2, before=3)
+        await measure("POST /payments/qr/init", lambda o, p: p.initiate_qr(qr_order, 10500), expected=2, before=3)
+        await measure("webhook PAYMENT_SUCCESS", lambda o, p: p.handle_webhook(qr_order, "PAYMENT_SUCCESS", {}), expected=2)
+        await measure("KDS outbox: claim + post", drain_outbox, expected=5)
+        await measure("GET status (completed, posted)", lambda o, p: p.check_status(qr_order), expected=1)
+
+        edc_order = await measure("POST /orders/ (EDC)", create, expected=2, before=3)
+        await measure("POST /payments/edc/init", lambda o, p: p.initiate_edc(edc_order, 10500, "store-1"), expected=2, before=3)
+
+        cash_order = await measure("POST /orders/ (cash)", create, expected=2, before=3)
+        await measure(
+            "POST /payments/cash/init",
+            lambda o, p: p.initiate_cash(cash_order, 10500, None, settings.CASH_PAYMENT_PIN),
+            expected=2,
+        )
+        await measure("KDS outbox: claim + post", drain_outbox, expected=5)
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(Order).where(Order.channel == BENCH_CHANNEL))
+            await db.commit()
+        await engine.dispose()
+    assert not mismatches, f"statement counts changed: {mismatches}"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
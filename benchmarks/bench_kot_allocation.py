@@ -0,0 +1,121 @@
+"""
+Concurrent order inserts: KotCounter row lock (SELECT ... FOR UPDATE) vs per-day sequence,
+alone (the default) and with KOT_SYNC_LEGACY_COUNTER on, as during a rollout.
+
+Each task allocates a KOT number, inserts an order and commits in its own
+session, like POST /orders/. Needs POSTGRES_DB_URL pointing at a scratch
+database; rows and sequences are written under synthetic dates in the past
+and removed afterwards.
+
+Usage: python -m benchmarks.bench_kot_allocation [n_orders] [concurrency]
+"""
+import sys
+import time
+import uuid
+import asyncio
+from datetime import date
+
+from sqlalchemy import delete, func, select, text
+
+from app.core.config import settings
+from app.db.session import Base, SessionLocal, engine
+from app.db.models.kot_counter import KotCounter
+from app.db.models.order import Order, OrderType, PaymentStatus, KdsStatus
+from app.services.kot_sequence import next_kot_numbers, sequence_name
+
+BENCH_CHANNEL = "bench-kot"
+
+
+async def row_lock_kot(session, kot_date: date) -> int:
+    # The pre-sequence allocator, kept here for comparison
+    result = await session.execute(select(KotCounter).where(KotCounter.kot_date == kot_date).with_for_update())
+    counter = result.scalar_one_or_none()
+    if counter is None:
+        counter = KotCounter(kot_date=kot_date, last_number=0)
+        session.add(counter)
+        await session.flush()
+    counter.last_number += 1
+    return counter.last_number
+
+
+async def sequence_kot(session, kot_date: date) -> int:
+    (number,) = await next_kot_numbers(session, kot_date)
+    return number
+
+
+async def create_order(allocate, kot_date: date, limiter: asyncio.Semaphore) -> None:
+    async with limiter, SessionLocal() as session:
+        kot_number = await allocate(session, kot_date)
+        session.add(Order(
+            order_id=f"BENCH-{uuid.uuid4().hex[:10].upper()}",
+            channel=BENCH_CHANNEL,
+            order_type=OrderType.DINEIN,
+            items=[{"sku_code": "1", "item_name": "Item 1", "quantity": 1, "unit_price": 100.0}],
+            total_amount_exclude_tax=100,
+            total_amount_include_tax=105,
+            kot_date=kot_date,
+            kot_number=kot_number,
+            kot_code=f"KTR-{kot_number}",
+            payment_status=PaymentStatus.PENDING,
+            kds_status=KdsStatus.NOT_POSTED,
+        ))
+        await session.commit()
+
+
+async def run(label: str, allocate, kot_date: date, n_orders: int, concurrency: int) -> None:
+    limiter = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(create_order(allocate, kot_date, limiter) for _ in range(n_orders)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    errors = [r for r in results if isinstance(r, Exception)]
+
+    async with SessionLocal() as session:
+        total, distinct = (await session.execute(
+            select(func.count(), func.count(func.distinct(Order.kot_number))).where(Order.kot_date == kot_date)
+        )).one()
+
+    print(f"{label:<10} orders={total:<6} distinct KOTs={distinct:<6} duplicates={total - distinct} "
+          f"errors={len(errors)}  {elapsed:6.2f} s  {total / elapsed:8.1f} orders/s")
+    if errors:
+        print(f"           first error: {errors[0]!r}")
+
+
+async def cleanup(dates) -> None:
+    async with SessionLocal() as session:
+        await session.execute(delete(Order).where(Order.channel == BENCH_CHANNEL))
+        await session.execute(delete(KotCounter).where(KotCounter.kot_date.in_(dates)))
+        for kot_date in dates:
+            await session.execute(text(f"DROP SEQUENCE IF EXISTS {sequence_name(kot_date)}"))
+        await session.commit()
+
+
+async def main() -> None:
+    n_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    lock_date, seq_date, synced_date = date(2000, 1, 1), date(2000, 1, 2), date(2000, 1, 3)
+    dates = [lock_date, seq_date, synced_date]
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await cleanup(dates)
+    # Seed the counter row so the row-lock run measures lock waits, not the first-insert race
+    async with SessionLocal() as session:
+        session.add(KotCounter(kot_date=lock_date, last_number=0))
+        await session.commit()
+
+    print(f"orders={n_orders} concurrency={concurrency} (pool size {engine.pool.size()})")
+    try:
+        await run("row lock", row_lock_kot, lock_date, n_orders, concurrency)
+        settings.KOT_SYNC_LEGACY_COUNTER = False
+        await run("sequence", sequence_kot, seq_date, n_orders, concurrency)
+        settings.KOT_SYNC_LEGACY_COUNTER = True
+        await run("seq+sync", sequence_kot, synced_date, n_orders, concurrency)
+    finally:
+        await cleanup(dates)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""
+Integer-paise pricing engine vs the float helpers it replaced.
+
+First checks, on randomly generated catalogs and baskets, that the engine's
+order totals and KDS tax amounts equal the same formulas evaluated in exact
+rational arithmetic, and counts where the old float code drifted from them
+(ceil of a total landing a hair above a whole rupee, half-paisa tax ties
+rounded down), and that catalog rows KDS would reject are kept out of the
+index. Then times one order's pricing with each implementation.
+
+Usage: python -m benchmarks.bench_pricing [n_cases] [lines_per_order]
+"""
+import sys
+import math
+import random
+import timeit
+from fractions import Fraction
+
+from app.services.catalog_index import CatalogIndex
+from app.services.pricing import SaleLine, order_totals, summarize_taxes
+from app.utils import tax_utils
+
+RATES = [0, 2.5, 5, 6, 9, 12, 14, 18, 28]
+
+
+def random_catalog(rng: random.Random, n_items: int) -> dict:
+    taxes = [
+        {"taxTypeId": f"t{i}", "name": f"TAX{i}", "percentage": rng.choice(RATES)}
+        for i in range(4)
+    ]
+    items = [
+        {
+            "skuCode": str(i),
+            "itemName": f"Item {i}",
+            "price": round(rng.uniform(1, 999), rng.choice([0, 1, 2])),
+            "status": "Active",
+            "isPriceIncludesTax": rng.random() < 0.4,
+            "taxTypeIds": rng.sample([t["taxTypeId"] for t in taxes] + ["missing"], rng.randint(0, 3)),
+        }
+        for i in range(n_items)
+    ]
+    return {"categories": [], "items": items, "taxTypes": taxes}
+
+
+def float_totals(index: CatalogIndex, basket: list) -> tuple[int, int]:
+    # create_order before the pricing engine
+    total_exc = 0.0
+    total_inc = 0.0
+    for sku, qty in basket:
+        item = index.item(sku)
+        line_total = item.price * qty
+        line_tax = 0.0
+        if not item.price_includes_tax:
+            for tax_id in item.tax_type_ids:
+                line_tax += line_total * (index.tax_percentage(tax_id) / 100.0)
+        total_exc += line_total
+        total_inc += line_total + line_tax
+    return math.ceil(total_exc), math.ceil(total_inc)
+
+
+def float_sale_lines(index: CatalogIndex, basket: list) -> tuple[list, list]:
+    lines = []
+    for sku, qty in basket:
+        line, _, _ = tax_utils.build_sale_item(index.item(sku).raw, qty, index.tax_meta)
+        lines.append(line)
+    summary = tax_utils.summarize_taxes(lines)
+    # The KDS payload never carried the per-line tax id
+    for line in lines:
+        for tax in line.get("taxes", []):
+            tax.pop("id", None)
+    return lines, summary
+
+
+def paise_sale_lines(index: CatalogIndex, basket: list) -> tuple[list, list]:
+    lines = [SaleLine(index.item(sku), qty) for sku, qty in basket]
+    return [line.to_rista() for line in lines], summarize_taxes(lines)
+
+
+def template_sale_lines(index: CatalogIndex, basket: list) -> tuple[list, list]:
+    # _construct_kds_payload: per-SKU templates, lines reused across orders
+    lines = [index.item(sku).sale_template.line(qty) for sku, qty in basket]
+    return [line.to_rista() for line in lines], summarize_taxes(lines)
+
+
+def exact_reference(index: CatalogIndex, basket: list) -> tuple[tuple[int, int], list]:
+    """The same formulas in exact rational arithmetic: totals, and per-line tax amounts in paise."""
+    def half_up(value: Fraction) -> int:
+        return math.floor(value + Fraction(1, 2))
+
+    total_exc = total_inc = Fraction(0)
+    line_taxes = []
+    for sku, qty in basket:
+        item = index.item(sku)
+        amount = Fraction(str(item.raw["price"])) * qty
+        taxes = []
+        for tax_id in item.tax_type_ids:
+            if tax_id not in index.taxes:
+                continue
+            rate = Fraction(str(index.taxes[tax_id].raw["percentage"]))
+            if item.price_includes_tax:
+                taxes.append((half_up(amount * 100 * rate / (100 + rate)), 0))
+            else:
+                taxes.append((0, half_up(amount * rate)))
+                total_inc += amount * rate / 100
+        total_exc += amount
+        total_inc += amount
+        line_taxes.append(taxes)
+    return (math.ceil(total_exc), math.ceil(total_inc)), line_taxes
+
+
+def check_equivalence(n_cases: int, lines_per_order: int) -> None:
+    rng = random.Random(1234)
+    mismatches = total_artifacts = line_artifacts = 0
+    for case in range(n_cases):
+        if case % 200 == 0:
+            index = CatalogIndex.build(random_catalog(rng, 50), f"v{case}")
+            skus = list(index.items)
+        basket = [(rng.choice(skus), rng.randint(1, 10)) for _ in range(rng.randint(1, lines_per_order))]
+        exact_totals, exact_taxes = exact_reference(index, basket)
+
+        new = order_totals((index.item(s), q) for s, q in basket)
+        if new != exact_totals:
+            mismatches += 1
+            print(f"totals differ from exact: {basket} paise={new} exact={exact_totals}")
+        elif float_totals(index, basket) != new:
+            # A float sum a hair above a whole rupee gets ceil'd up by one
+            total_artifacts += 1
+
+        lines = [SaleLine(index.item(s), q) for s, q in basket]
+        if [[(inc, exc) for _, inc, exc in line.taxes] for line in lines] != exact_taxes:
+            mismatches += 1
+            print(f"tax amounts differ from exact: {basket}")
+        elif template_sale_lines(index, basket) != paise_sale_lines(index, basket):
+            mismatches += 1
+            print(f"template lines differ from fresh lines: {basket}")
+        elif float_sale_lines(index, basket) != paise_sale_lines(index, basket):
+            # An exact half-paisa tie computed as x.xx4999... in floats and rounded down
+            line_artifacts += 1
+
+    print(f"equivalence over {n_cases} random orders:")
+    print(f"  paise engine vs exact arithmetic:  {mismatches} mismatches")
+    print(f"  float code off by a rupee (ceil):  {total_artifacts} orders")
+    print(f"  float code off by a paisa (ties):  {line_artifacts} orders")
+
+
+def check_validation() -> None:
+    bad_taxes = {
+        "no-name": {"taxTypeId": "no-name", "percentage": 5},
+        "null-name": {"taxTypeId": "null-name", "name": None, "percentage": 5},
+        "blank-name": {"taxTypeId": "blank-name", "name": " ", "percentage": 5},
+        "nan-rate": {"taxTypeId": "nan-rate", "name": "NAN", "percentage": float("nan")},
+    }
+    catalog = {
+        "categories": [],
+        "taxTypes": [{"taxTypeId": "ok", "name": "GST", "percentage": 5}, *bad_taxes.values()],
+        "items": [
+            {"skuCode": "ok", "itemName": "Tea", "price": 20, "status": "Active", "taxTypeIds": ["ok"]},
+            {"skuCode": "no-item-name", "price": 20, "status": "Active", "taxTypeIds": ["ok"]},
+            *(
+                {"skuCode": f"with-{tax_id}", "itemName": "Tea", "price": 20, "status": "Active", "taxTypeIds": [tax_id]}
+                for tax_id in bad_taxes
+            ),
+        ],
+    }
+    index = CatalogIndex.build(catalog, "validation")
+    expected = {f"tax {t}" for t in bad_taxes} | {f"sku with-{t}" for t in bad_taxes} | {"sku no-item-name"}
+    assert set(index.problems) == expected, dict(index.problems)
+    assert list(index.items) == ["ok"] and list(index.taxes) == ["ok"]
+    print(f"validation: {len(index.problems)} rows KDS would reject kept out of the index")
+
+
+def main() -> None:
+    n_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    check_equivalence(n_cases, lines)
+    check_validation()
+
+    rng = random.Random(7)
+    index = CatalogIndex.build(random_catalog(rng, 200), "bench")
+    basket = [(sku, rng.randint(1, 5)) for sku in rng.sample(list(index.items), lines)]
+    runs = 2000
+
+    def timed(fn) -> float:
+        return min(timeit.repeat(fn, number=runs, repeat=3)) / runs
+
+    old_totals = timed(lambda: float_totals(index, basket))
+    new_totals = timed(lambda: order_totals((index.item(s), q) for s, q in basket))
+    old_lines = timed(lambda: float_sale_lines(index, basket))
+    new_lines = timed(lambda: paise_sale_lines(index, basket))
+    template_lines = timed(lambda: template_sale_lines(index, basket))
+
+    print(f"\nlines/order={lines}")
+    print(f"order totals  float: {old_totals * 1e6:7.1f} us   paise: {new_totals * 1e6:7.1f} us  ({old_totals / new_totals:.1f}x)")
+    print(f"KDS sale body float: {old_lines * 1e6:7.1f} us   paise: {new_lines * 1e6:7.1f} us  ({old_lines / new_lines:.1f}x)")
+    print(f"KDS sale body (per-SKU templates, warm):   {template_lines * 1e6:7.1f} us  ({old_lines / template_lines:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()